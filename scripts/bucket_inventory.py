@@ -0,0 +1,9 @@
+#!/usr/bin/env python3
+
+#
+# Runs macie_automations/bucket_inventory.py, so ./scripts/bucket_inventory.py works from a checkout without installing.
+#
+
+import runpy
+
+runpy.run_module('macie_automations.bucket_inventory', run_name='__main__')
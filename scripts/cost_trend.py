@@ -0,0 +1,9 @@
+#!/usr/bin/env python3
+
+#
+# Runs macie_automations/cost_trend.py, so ./scripts/cost_trend.py works from a checkout without installing.
+#
+
+import runpy
+
+runpy.run_module('macie_automations.cost_trend', run_name='__main__')
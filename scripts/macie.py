@@ -0,0 +1,9 @@
+#!/usr/bin/env python3
+
+#
+# Runs macie_automations/macie.py, so ./scripts/macie.py works from a checkout without installing.
+#
+
+import runpy
+
+runpy.run_module('macie_automations.macie', run_name='__main__')
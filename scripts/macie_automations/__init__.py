@@ -0,0 +1,5 @@
+#
+# AWS Macie automation scripts. Each script is a module here that can be run with `macie <command>` once
+# installed, `python -m macie_automations.<script>`, or ./scripts/<script>.py from a checkout. The macie_*
+# modules are the code the scripts share.
+#
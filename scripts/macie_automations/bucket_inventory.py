@@ -0,0 +1,94 @@
+#
+# Snapshot Macie's bucket inventory for all regions into a local database, so cost estimates and bucket
+# lookups don't have to page through describe_buckets every time
+#
+
+import json
+
+from macie_automations.macie_clients import add_common_args, start_common
+from macie_automations.macie_fanout import report_errors
+from macie_automations.macie_inventory import open_inventory, refresh_inventory, find_bucket, get_buckets, DEFAULT_TTL
+from macie_automations.macie_regions import resolve_regions
+
+import logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+logging.getLogger('botocore').setLevel(logging.WARNING)
+logging.getLogger('boto3').setLevel(logging.WARNING)
+logging.getLogger('urllib3').setLevel(logging.WARNING)
+
+DIVISOR = 1024*1024*1024
+
+
+def main(args, logger):
+
+    db = open_inventory(args.database)
+
+    regions = resolve_regions(args)
+    region_results = refresh_inventory(db, regions, force=args.refresh, ttl=args.ttl, max_workers=args.max_workers)
+
+    if args.bucket:
+        region, bucket_info = find_bucket(db, args.bucket)
+        if bucket_info is None:
+            print(f"{args.bucket} isn't in the inventory")
+        else:
+            print(f"{args.bucket} is in {region} owned by {bucket_info['accountId']}")
+            print(json.dumps(bucket_info, indent=2))
+        report_errors(region_results)
+        return
+
+    for r in regions:
+        buckets = get_buckets(db, region=r)
+        if len(buckets) == 0:
+            continue
+        public_count = len([b for b in buckets if b['effective_permission'] == "PUBLIC"])
+        size = sum([b['classifiable_size_in_bytes'] for b in buckets])
+        objects = sum([b['classifiable_object_count'] for b in buckets])
+        print(f"{r}: {len(buckets):,} buckets ({public_count:,} public) with {objects:,} classifiable objects, {int(size/DIVISOR):,} GB")
+
+    report_errors(region_results)
+
+
+def do_args():
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--debug", help="print debugging info", action='store_true')
+    parser.add_argument("--error", help="print error info only", action='store_true')
+    parser.add_argument("--region", help="Only run in this region")
+    parser.add_argument("--bucket", help="Show the inventory for this bucket")
+    parser.add_argument("--refresh", help="Re-read every region, even if the snapshot is current", action='store_true')
+    parser.add_argument("--ttl", help="Re-read a region when its data is older than this many seconds", type=int, default=DEFAULT_TTL)
+    parser.add_argument("--database", help="Inventory database to use. Defaults to one per AWS profile in the cache directory")
+    add_common_args(parser)
+    args = parser.parse_args()
+    return(args)
+
+
+if __name__ == '__main__':
+
+    args = do_args()
+
+    # Logging idea stolen from: https://docs.python.org/3/howto/logging.html#configuring-logging
+    # create console handler and set level to debug
+    ch = logging.StreamHandler()
+    if args.error:
+        logger.setLevel(logging.ERROR)
+    elif args.debug:
+        logger.setLevel(logging.DEBUG)
+    else:
+        logger.setLevel(logging.INFO)
+
+    # create formatter
+    # formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    formatter = logging.Formatter('%(name)s - %(levelname)s - %(message)s')
+    # add formatter to ch
+    ch.setFormatter(formatter)
+    # add ch to logger
+    logger.addHandler(ch)
+
+    start_common(args)
+
+    try:
+        main(args, logger)
+    except KeyboardInterrupt:
+        exit(1)
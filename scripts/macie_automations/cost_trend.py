@@ -0,0 +1,123 @@
+#
+# How has the cost of Macie changed from day to day, and did it jump anywhere it shouldn't have?
+# Works from the cost history get_macie_actual_cost.py saves each time it runs, so it never calls AWS.
+# Run get_macie_actual_cost.py daily (with --by-account to break it down by account) to build the history.
+#
+
+import csv
+
+from macie_automations.macie_cost_history import open_cost_history, load_cost_history, cost_trend, DEFAULT_WINDOW, DEFAULT_THRESHOLD, DEFAULT_MIN_CHANGE
+from macie_automations.macie_usage import USAGE_COLUMNS
+
+import logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+logging.getLogger('botocore').setLevel(logging.WARNING)
+logging.getLogger('boto3').setLevel(logging.WARNING)
+logging.getLogger('urllib3').setLevel(logging.WARNING)
+
+
+def main(args, logger):
+    db = open_cost_history(args.history_db)
+    series, dates = load_cost_history(db, args.timerange, args.group_by)
+    db.close()
+    if len(dates) == 0:
+        logger.error(f"No {args.timerange} costs saved yet. Run get_macie_actual_cost.py to start the history")
+        exit(1)
+    logger.debug(f"{len(series):,} groups over {len(dates)} days, {dates[0]} to {dates[-1]}")
+
+    trends = {key: cost_trend(costs, dates, args.timerange, window=args.window, threshold=args.threshold,
+                              min_change=args.min_change) for key, costs in series.items()}
+    # Biggest spenders on the latest day first
+    keys = sorted(trends, key=lambda k: -trends[k][-1][1])
+    columns = args.group_by or ['total']
+
+    if args.csv:
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['date'] + columns + ['cost', 'change', 'per_day', 'anomaly'])
+            for key in keys:
+                for d, cost, change, per_day, anomaly in trends[key]:
+                    writer.writerow([d] + (list(key) or ['total']) + [f"{cost:.2f}", money(change), money(per_day), anomaly or ""])
+        logger.info(f"Wrote {len(keys):,} groups over {len(dates)} days to {args.csv}")
+
+    anomalies = 0
+    shown = 0
+    for key in keys:
+        rows = trends[key][-args.days:]
+        if args.anomalies:
+            rows = [row for row in rows if row[4] is not None]
+        anomalies += len([row for row in rows if row[4] is not None])
+        if args.csv or len(rows) == 0 or (args.top and shown >= args.top):
+            continue
+        shown += 1
+        print(f"\n{' / '.join(key) or 'Total'}")
+        print(f"{'Date':<12} {'Cost':>12} {'Change':>12} {'Per Day':>12}")
+        for d, cost, change, per_day, anomaly in rows:
+            print(f"{d:<12} {cost:>12,.2f} {money(change, ','):>12} {money(per_day, ','):>12} {anomaly or ''}".rstrip())
+
+    print(f"\n{anomalies:,} anomalies in the last {args.days} days of {len(keys):,} {', '.join(columns)} groups")
+
+
+def money(value, separator=""):
+    if value is None:
+        return("")
+    return(f"{value:{separator}.2f}")
+
+
+def do_args():
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--debug", help="print debugging info", action='store_true')
+    parser.add_argument("--error", help="print error info only", action='store_true')
+    parser.add_argument("--history-db", help="Cost history database get_macie_actual_cost.py saved to "
+                        "(default: the one for this AWS profile in the cache directory)")
+    parser.add_argument("--timerange", help="Which of the saved costs to look at. MONTH_TO_DATE gives the spend each day",
+                        choices=['MONTH_TO_DATE', 'PAST_30_DAYS'], default='MONTH_TO_DATE')
+    parser.add_argument("--group-by", help=f"Comma separated columns to follow the cost of separately, from {', '.join(USAGE_COLUMNS)} "
+                        "(default: one total)", default="")
+    parser.add_argument("--days", help="How many of the latest days to show", type=int, default=14)
+    parser.add_argument("--top", help="How many groups to show, most expensive first", type=int, default=20)
+    parser.add_argument("--anomalies", help="Only show the days that were flagged", action='store_true')
+    parser.add_argument("--window", help="How many earlier days each day is compared with", type=int, default=DEFAULT_WINDOW)
+    parser.add_argument("--threshold", help="How unusual a day has to be to be flagged, in robust standard deviations",
+                        type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--min-change", help="How many dollars a day a flagged day has to be out by", type=float,
+                        default=DEFAULT_MIN_CHANGE)
+    parser.add_argument("--csv", help="Write every day of every group to this CSV file instead of showing them")
+    args = parser.parse_args()
+    return(args)
+
+
+if __name__ == '__main__':
+
+    args = do_args()
+
+    args.group_by = [c for c in args.group_by.split(",") if c != ""]
+    for column in args.group_by:
+        if column not in USAGE_COLUMNS:
+            print(f"--group-by {column} isn't one of {', '.join(USAGE_COLUMNS)}")
+            exit(1)
+
+    # Logging idea stolen from: https://docs.python.org/3/howto/logging.html#configuring-logging
+    # create console handler and set level to debug
+    ch = logging.StreamHandler()
+    if args.error:
+        logger.setLevel(logging.ERROR)
+    elif args.debug:
+        logger.setLevel(logging.DEBUG)
+    else:
+        logger.setLevel(logging.INFO)
+
+    # create formatter
+    # formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    formatter = logging.Formatter('%(name)s - %(levelname)s - %(message)s')
+    # add formatter to ch
+    ch.setFormatter(formatter)
+    # add ch to logger
+    logger.addHandler(ch)
+
+    try:
+        main(args, logger)
+    except KeyboardInterrupt:
+        exit(1)
@@ -0,0 +1,201 @@
+#
+# Create one-time or weekly scan jobs on a specific bucket or all buckets
+#
+
+import json
+import sys
+
+from macie_automations.macie_clients import get_client, add_common_args, start_common
+from macie_automations.macie_fanout import fan_out, report_errors
+from macie_automations.macie_jobs import build_job, pack_jobs, write_plan, load_plan, plan_bucket_count, PUBLIC_CRITERIA
+from macie_automations.macie_inventory import open_inventory, refresh_inventory, find_bucket, lookup_bucket
+from macie_automations.macie_regions import resolve_regions
+
+import logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+logging.getLogger('botocore').setLevel(logging.WARNING)
+logging.getLogger('boto3').setLevel(logging.WARNING)
+logging.getLogger('urllib3').setLevel(logging.WARNING)
+
+
+def main(args, logger):
+
+    if args.apply:
+        apply_plan(args)
+        return
+
+    if not args.name:
+        print("--name is required")
+        exit(1)
+
+    # Macie is regional even though buckets aren't. So we need to iterate across regions to find out bucket
+    # Unless you know already
+    regions = resolve_regions(args)
+
+    if args.bucket_file:
+        if not args.plan_file:
+            print("--plan-file is required with --bucket-file")
+            exit(1)
+        if not args.weekly and not args.onetime:
+            print("Neither --weekly or --onetime specified")
+            return
+        plan_bucket_jobs(args, regions)
+        return
+
+    if args.bucket:
+        # Macie already told us where the bucket is when we took the inventory, otherwise go look for it
+        r, bucket_info = lookup_bucket(open_inventory(), args.bucket, regions, live=args.live, max_workers=args.max_workers)
+        if bucket_info is None:
+            logger.error(f"Unable to find {args.bucket} in {regions}")
+            exit(1)
+        logger.info(f"Found {args.bucket} in {r}")
+        macie_client = get_client('macie2', r)
+        if args.weekly:
+            create_scheduled_job(macie_client, args, r, bucket=args.bucket, accountId=bucket_info['accountId'])
+        elif args.onetime:
+            create_one_time_job(macie_client, args, r, bucket=args.bucket, accountId=bucket_info['accountId'])
+        else:
+            print("Neither --weekly or --onetime specified")
+        # Found the bucket, we're done here.
+        exit(0)
+    else:
+        if not args.weekly and not args.onetime:
+            print("Neither --weekly or --onetime specified")
+            return
+        region_results = fan_out(create_region_job, regions, args, max_workers=args.max_workers)
+        report_errors(region_results)
+
+
+def create_region_job(r, args):
+    # Create the public bucket job in this region
+    macie_client = get_client('macie2', r)
+    if args.weekly:
+        create_scheduled_job(macie_client, args, r)
+    elif args.onetime:
+        create_one_time_job(macie_client, args, r)
+
+
+def create_one_time_job(client, args, region, bucket=None, accountId=None):
+    job = build_job('ONE_TIME', f"{args.name}-{region}", bucket_definition(bucket, accountId), args.description, args.sample)
+    submit_job(client, job, region, args.actually_do_it)
+
+
+def create_scheduled_job(client, args, region, bucket=None, accountId=None):
+    job = build_job('SCHEDULED', f"{args.name}-{region}", bucket_definition(bucket, accountId), args.description, args.sample)
+    submit_job(client, job, region, args.actually_do_it)
+
+
+def bucket_definition(bucket=None, accountId=None):
+    # The s3JobDefinition for one bucket, or all the public buckets
+    if bucket is None:
+        return(PUBLIC_CRITERIA)
+    return({'bucketDefinitions': [{"accountId": accountId, 'buckets': [bucket]}]})
+
+
+def submit_job(client, job, region, actually_do_it):
+    if actually_do_it:
+        response = client.create_classification_job(**job)
+        logger.info(f"Job {job['name']} created in {region} with ID: {response['jobId']} ({response['jobArn']})")
+    else:
+        logger.info(f"Would create job {json.dumps(job, indent=2)}")
+
+
+def plan_bucket_jobs(args, regions):
+    """Work out the fewest jobs that will scan every bucket in args.bucket_file and write them to
+    args.plan_file. Buckets are grouped by region, and by account within each job."""
+    with open(args.bucket_file) as f:
+        bucket_names = sorted(set(f.read().split()))
+
+    # Resolve every bucket from the inventory, refreshing it once rather than looking for each bucket
+    db = open_inventory()
+    region_results = refresh_inventory(db, regions, force=args.live, max_workers=args.max_workers)
+    by_region = {}
+    unresolved = []
+    for bucket_name in bucket_names:
+        r, bucket_info = find_bucket(db, bucket_name)
+        if bucket_info is None or r not in regions:
+            unresolved.append(bucket_name)
+            continue
+        by_region.setdefault(r, {}).setdefault(bucket_info['accountId'], []).append(bucket_name)
+
+    jobType = 'SCHEDULED' if args.weekly else 'ONE_TIME'
+    jobs = pack_jobs(by_region, jobType, args.name, args.description, args.sample)
+    write_plan(args.plan_file, jobs, unresolved=unresolved)
+
+    for j in jobs:
+        print(f"{j['job']['name']} in {j['region']} will scan {plan_bucket_count(j)} buckets")
+    for bucket_name in unresolved:
+        logger.warning(f"Unable to find {bucket_name} in the bucket inventory")
+    print(f"Wrote {len(jobs)} jobs for {len(bucket_names) - len(unresolved)} buckets to {args.plan_file}")
+    report_errors(region_results)
+
+
+def apply_plan(args):
+    """Create the jobs in args.apply, all regions at once."""
+    plan = load_plan(args.apply)
+    by_region = {}
+    for j in plan['jobs']:
+        by_region.setdefault(j['region'], []).append(j['job'])
+
+    region_results = fan_out(apply_region_jobs, list(by_region), by_region, args.actually_do_it,
+                             max_workers=args.max_workers)
+    report_errors(region_results)
+
+
+def apply_region_jobs(r, by_region, actually_do_it):
+    macie_client = get_client('macie2', r)
+    for job in by_region[r]:
+        submit_job(macie_client, job, r, actually_do_it)
+
+
+def do_args():
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--debug", help="print debugging info", action='store_true')
+    parser.add_argument("--error", help="print error info only", action='store_true')
+    parser.add_argument("--region", help="Only create the job in this region")
+    parser.add_argument("--bucket", help="Create Job to only scan this bucket")
+    parser.add_argument("--live", help="Look the bucket up in Macie rather than the bucket inventory", action='store_true')
+    parser.add_argument("--actually-do-it", help="Actually create the job. Omitting this is a dry-run", action='store_true')
+    parser.add_argument("--bucket-file", help="Plan jobs to scan every bucket in this file (one per line)")
+    parser.add_argument("--plan-file", help="Where to write the plan for --bucket-file")
+    parser.add_argument("--apply", help="Create the jobs in this plan file")
+    parser.add_argument("--sample", help="Percentage of objects to randomly scan", type=int, default=100)
+    parser.add_argument("--name", help="Name of the job to execute. Required unless using --apply")
+    parser.add_argument("--description", help="Description to apply to each job", default=f"Created by {sys.argv[0]}")
+    parser.add_argument("--weekly", help="Create a weekly scan job of new objects", action='store_true')
+    parser.add_argument("--onetime", help="Create a one time scan of all objects", action='store_true')
+    add_common_args(parser)
+    args = parser.parse_args()
+    return(args)
+
+
+if __name__ == '__main__':
+
+    args = do_args()
+
+    # Logging idea stolen from: https://docs.python.org/3/howto/logging.html#configuring-logging
+    # create console handler and set level to debug
+    ch = logging.StreamHandler()
+    if args.error:
+        logger.setLevel(logging.ERROR)
+    elif args.debug:
+        logger.setLevel(logging.DEBUG)
+    else:
+        logger.setLevel(logging.INFO)
+
+    # create formatter
+    # formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    formatter = logging.Formatter('%(name)s - %(levelname)s - %(message)s')
+    # add formatter to ch
+    ch.setFormatter(formatter)
+    # add ch to logger
+    logger.addHandler(ch)
+
+    start_common(args)
+
+    try:
+        main(args, logger)
+    except KeyboardInterrupt:
+        exit(1)
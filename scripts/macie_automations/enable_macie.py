@@ -0,0 +1,228 @@
+#
+# Configure Macie in the Delegated Admin account & add and enable all org members
+#
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from macie_automations.macie_clients import get_client, add_common_args, start_common
+from macie_automations.macie_fanout import fan_out, report_errors
+from macie_automations.macie_regions import resolve_regions
+
+import logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+logging.getLogger('botocore').setLevel(logging.WARNING)
+logging.getLogger('boto3').setLevel(logging.WARNING)
+logging.getLogger('urllib3').setLevel(logging.WARNING)
+
+# criteria for a job that will scan all public buckets
+PUBLIC_CRITERIA = {
+    'bucketCriteria': {
+        "includes": {"and": [{
+            "simpleCriterion": {
+                "comparator": "EQ",
+                "key": "S3_BUCKET_EFFECTIVE_PERMISSION",
+                "values": ["PUBLIC"]
+                }
+            }]
+        }}
+    }
+
+
+def main(args, logger):
+
+    # We need a list of all accounts. Like GuardDuty we need to pass in the root email
+    accounts = list_accounts()
+    # we can't add ourselves to ourself, so get this account id to ignore later
+    my_account_id = get_my_account_id()
+
+    # These are the accounts that should be Macie members in every region
+    wanted = {}
+    for a in accounts:
+        if a['Id'] == my_account_id:
+            # I can't process myself
+            continue
+        # Organizations returns SUSPENDED account too
+        if a['Status'] != "ACTIVE":
+            continue
+        wanted[a['Id']] = a
+    if args.account_list:
+        with open(args.account_list) as f:
+            account_ids = set(f.read().split())
+        wanted = {k: v for k, v in wanted.items() if k in account_ids}
+    logger.debug(f"{len(wanted)} of {len(accounts)} accounts should be Macie members")
+
+    # Macie is a regional service
+    regions = resolve_regions(args, refresh=True)
+
+    region_results = fan_out(configure_region, regions, args, wanted, max_workers=args.max_workers)
+
+    # Summary of what was (or would be) done everywhere
+    for region_result in region_results:
+        if region_result.error is not None:
+            continue
+        plan = region_result.result
+        changes = []
+        if plan['autoEnable']:
+            changes.append("enable autoEnable")
+        if plan['exportConfiguration']:
+            changes.append("update export configuration")
+        if len(plan['addMembers']) > 0:
+            changes.append(f"add {len(plan['addMembers'])} members")
+        if len(plan['readdMembers']) > 0:
+            changes.append(f"re-add {len(plan['readdMembers'])} removed members")
+        if len(changes) == 0:
+            changes.append("nothing to do")
+        verb = "Done" if args.actually_do_it else "Plan"
+        failed = ""
+        if plan['failedMembers'] > 0:
+            failed = f" ({plan['failedMembers']} members failed)"
+        print(f"{verb} for {region_result.region}: {', '.join(changes)}{failed}")
+        for account_id, status in plan['notEnabledMembers']:
+            print(f"  {account_id} is a member in {region_result.region} but its status is {status}")
+    report_errors(region_results)
+
+
+def configure_region(r, args, wanted):
+    """Bring this region in line: org autoEnable on, findings exported to our bucket and every wanted
+    account a member. Only makes the calls that would change something. Returns the plan."""
+    logger.info(f"Processing region {r}")
+    macie_client = get_client('macie2', r)
+    plan = {'autoEnable': False, 'exportConfiguration': False, 'addMembers': [], 'readdMembers': [],
+            'notEnabledMembers': [], 'failedMembers': 0}
+
+    response = macie_client.describe_organization_configuration()
+    if response['autoEnable'] is False:
+        plan['autoEnable'] = True
+        if args.actually_do_it:
+            logger.info(f"Auto Enabling new accounts in {r}")
+            macie_client.update_organization_configuration(autoEnable=True)
+        else:
+            logger.info(f"Need to autoEnable new accounts in {r}")
+
+    # Configure the output bucket, unless it's already right
+    s3Destination = {
+        'bucketName': args.bucket,
+        'keyPrefix': f"{r}/",
+        'kmsKeyArn': args.KMSKey
+    }
+    response = macie_client.get_classification_export_configuration()
+    if response.get('configuration', {}).get('s3Destination') != s3Destination:
+        plan['exportConfiguration'] = True
+        if args.actually_do_it:
+            logger.info(f"Applying export configuration {args.bucket} w/ {args.KMSKey} in {r}")
+            macie_client.put_classification_export_configuration(configuration={'s3Destination': s3Destination})
+        else:
+            logger.info(f"Need to apply export configuration {args.bucket} w/ {args.KMSKey} in {r}")
+
+    # idempotency! Only add the accounts that aren't already members. A removed member can be added back,
+    # but one that's paused or still has an invitation out has to be sorted out in that account
+    current_members = get_members(macie_client)
+    plan['addMembers'] = sorted(set(wanted) - set(current_members))
+    for account_id in sorted(set(wanted) & set(current_members)):
+        status = current_members[account_id]
+        if status == "Removed":
+            plan['readdMembers'].append(account_id)
+        elif status != "Enabled":
+            plan['notEnabledMembers'].append((account_id, status))
+
+    if not args.actually_do_it:
+        for account_id in plan['addMembers']:
+            logger.info(f"Need to add {account_id} to Macie in {r}")
+        for account_id in plan['readdMembers']:
+            logger.info(f"Need to add removed member {account_id} back to Macie in {r}")
+        return(plan)
+
+    from botocore.exceptions import ClientError
+
+    def add_member(account_id):
+        logger.info(f"Adding {account_id} to Macie in {r}")
+        macie_client.create_member(account={'accountId': account_id, 'email': wanted[account_id]['Email']})
+
+    # The rate limiter keeps these under Macie's limits
+    with ThreadPoolExecutor(max_workers=args.member_workers) as executor:
+        futures = {executor.submit(add_member, account_id): account_id
+                   for account_id in plan['addMembers'] + plan['readdMembers']}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except ClientError as e:
+                logger.error(f"Unable to add {futures[future]} to Macie in {r}: {e}")
+                plan['failedMembers'] += 1
+
+    return(plan)
+
+
+def get_members(client):
+    # Return {account id: relationshipStatus} for every macie member, enabled or not
+    output = {}
+    paginator = client.get_paginator('list_members')
+    for page in paginator.paginate(PaginationConfig={'PageSize': 25}):
+        for a in page['members']:
+            output[a['accountId']] = a['relationshipStatus']
+            if a['relationshipStatus'] != "Enabled":
+                logger.debug(f"Account {a['accountId']} is status {a['relationshipStatus']}")
+    return(output)
+
+
+def get_my_account_id():
+    client = get_client('sts')
+    response = client.get_caller_identity()
+    return(response['Account'])
+
+
+def list_accounts():
+    # A Delegated Admin account has this permission to call organizations:list_accounts()
+    # 20 is the most list_accounts() will return in a page
+    client = get_client('organizations')
+    output = []
+    paginator = client.get_paginator('list_accounts')
+    for page in paginator.paginate(PaginationConfig={'PageSize': 20}):
+        output = output + page['Accounts']
+    return(output)
+
+
+def do_args():
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--debug", help="print debugging info", action='store_true')
+    parser.add_argument("--error", help="print error info only", action='store_true')
+    parser.add_argument("--actually-do-it", help="Enable existing detector in Delegated Admin", action='store_true')
+    parser.add_argument("--account-list", help="Only Process this file of accounts (one account id per line)")
+    parser.add_argument("--region", help="Only Process this region")
+    parser.add_argument("--bucket", help="Bucket to Push Findings to", required=True)
+    parser.add_argument("--KMSKey", help="KMS Key Arn to encrypt the findings", required=True)
+    parser.add_argument("--member-workers", help="Number of members to add at once in each region", type=int, default=4)
+    add_common_args(parser, refresh_regions=False)
+    args = parser.parse_args()
+    return(args)
+
+
+if __name__ == '__main__':
+
+    args = do_args()
+
+    # Logging idea stolen from: https://docs.python.org/3/howto/logging.html#configuring-logging
+    # create console handler and set level to debug
+    ch = logging.StreamHandler()
+    if args.error:
+        logger.setLevel(logging.ERROR)
+    elif args.debug:
+        logger.setLevel(logging.DEBUG)
+    else:
+        logger.setLevel(logging.INFO)
+
+    # create formatter
+    # formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    formatter = logging.Formatter('%(name)s - %(levelname)s - %(message)s')
+    # add formatter to ch
+    ch.setFormatter(formatter)
+    # add ch to logger
+    logger.addHandler(ch)
+
+    start_common(args)
+
+    try:
+        main(args, logger)
+    except KeyboardInterrupt:
+        exit(1)
@@ -0,0 +1,216 @@
+#
+# Extract a CSV (or JSONL, Parquet or SQLite) of findings for a particular bucket
+#
+
+import copy
+import json
+import os
+from datetime import datetime
+
+from macie_automations.macie_clients import add_common_args, start_common
+from macie_automations.macie_fanout import report_errors
+from macie_automations.macie_cache import load_json, save_json, profile_name
+from macie_automations.macie_findings import build_criteria, stream_findings, stream_exported_findings, epoch_millis, DEFAULT_BATCHES_IN_FLIGHT
+from macie_automations.macie_profile import stage, timed
+from macie_automations.macie_regions import resolve_regions
+from macie_automations.macie_sinks import open_sink, format_for, FORMATS, DEFAULT_ROW_GROUP_SIZE
+
+import logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+logging.getLogger('botocore').setLevel(logging.WARNING)
+logging.getLogger('boto3').setLevel(logging.WARNING)
+logging.getLogger('urllib3').setLevel(logging.WARNING)
+
+
+def main(args, logger):
+
+    # Store bucket results
+    results = {
+        "Low": 0,
+        "Medium": 0,
+        "High": 0
+    }
+
+    since = None
+    if args.since:
+        since = datetime.strptime(args.since, "%Y-%m-%d")
+    filters = {'bucket': args.bucket, 'job_id': args.job_id, 'severity': args.severity,
+               'since': since}
+
+    # In incremental mode only pull findings updated since the last run, and add them to the end of the file
+    watermarks = None
+    sortCriteria = None
+    if args.incremental:
+        watermarks = load_watermarks(args)
+        sortCriteria = {'attributeName': 'updatedAt', 'orderBy': 'ASC'}
+
+    region_results = []
+    if args.export_source:
+        # Read what Macie already exported to S3. No Macie API calls at all.
+        regions = None
+        if args.region:
+            regions = [args.region]
+        findings = stream_exported_findings(args.export_source, regions, region_results, **filters)
+    else:
+        # Macie is regional even though buckets aren't. So we need to iterate across regions to find out bucket
+        # Unless you know already
+        regions = resolve_regions(args)
+
+        # Build a Findings criteria dictionary to pass to Macie2
+        if args.incremental:
+            # Each region picks up from its own watermark
+            def findingCriteria(r):
+                return(build_criteria(updated_since=watermarks.get(r, {}).get('updatedAt'), **filters))
+        else:
+            findingCriteria = build_criteria(**filters)
+            logger.debug(f"findingCriteria: {json.dumps(findingCriteria, indent=2)}")
+
+        # Regions list and fetch their findings in parallel, and the rows come back in region order
+        findings = stream_findings(regions, findingCriteria, region_results, sortCriteria=sortCriteria,
+                                   max_workers=args.max_workers, batches_in_flight=args.batches_in_flight)
+
+    fmt = args.format or format_for(args.filename)
+    sink = open_sink(fmt, args.filename, append=args.incremental, row_group_size=args.row_group_size)
+    try:
+        # Time spent waiting on Macie vs writing the file, for --profile-api
+        for r, batch in timed("wait for findings", findings):
+            if watermarks is not None:
+                # Move a copy of the region's watermark along, so a batch that fails to write isn't skipped next time
+                pending = {r: copy.deepcopy(watermarks[r])} if r in watermarks else {}
+                batch = [f for f in sorted(batch, key=updated_order) if advance_watermark(pending, r, f)]
+            with stage(f"write {fmt}"):
+                sink.write(r, batch)
+            if watermarks is not None:
+                watermarks.update(pending)
+            for f in batch:
+                results[f['severity']['description']] += 1
+    finally:
+        sink.close()
+        # Only batches that were written have moved the watermarks, so even a failed run keeps the progress it made
+        if watermarks is not None:
+            save_watermarks(args, watermarks)
+
+    print(f"Exported High: {results['High']} Medium: {results['Medium']} Low: {results['Low']} ")
+    report_errors(region_results)
+
+
+def watermark_name(args):
+    if args.state_file:
+        return(os.path.abspath(args.state_file))
+    return(f"watermarks-{profile_name()}.json")
+
+
+def load_watermarks(args):
+    """Return the {region: {'updatedAt': epoch ms, 'ids': [...]}} watermarks for this output file."""
+    # Keep a separate set of watermarks for every output file
+    state = load_json(watermark_name(args)) or {}
+    return(state.get(os.path.abspath(args.filename), {}))
+
+
+def save_watermarks(args, watermarks):
+    state = load_json(watermark_name(args)) or {}
+    state[os.path.abspath(args.filename)] = watermarks
+    save_json(watermark_name(args), state)
+
+
+def updated_order(f):
+    return((epoch_millis(f['updatedAt']), f['id']))
+
+
+def advance_watermark(watermarks, r, f):
+    """Move the region's watermark up to this finding. Returns False if the finding was already exported.
+
+    Findings have to be given in updated_order. Many findings can share an updatedAt, so the ids at the
+    watermark are remembered too."""
+    updated_at = epoch_millis(f['updatedAt'])
+    mark = watermarks.setdefault(r, {'updatedAt': 0, 'ids': []})
+    if updated_at < mark['updatedAt']:
+        return(False)
+    if updated_at == mark['updatedAt']:
+        if f['id'] in mark['ids']:
+            return(False)
+        mark['ids'].append(f['id'])
+    else:
+        mark['updatedAt'] = updated_at
+        mark['ids'] = [f['id']]
+    return(True)
+
+
+def do_args():
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--debug", help="print debugging info", action='store_true')
+    parser.add_argument("--error", help="print error info only", action='store_true')
+    parser.add_argument("--region", help="Only Process this region")
+    parser.add_argument("--bucket", help="Only price out this bucket")
+    parser.add_argument("--job-id", help="Only return results from this job id")
+    parser.add_argument("--filename", help="Save to filename", required=True)
+    parser.add_argument("--since", help="Only output findings after this date - specified as YYYY-MM-DD")
+    parser.add_argument("--severity", help="Filter on this severity and higher",
+                        choices=['High', 'Medium', 'Low'], default='Medium')
+    parser.add_argument("--format", help="Output format. Defaults to the filename's extension, or csv",
+                        choices=FORMATS)
+    parser.add_argument("--row-group-size", help="Findings per parquet row group", type=int, default=DEFAULT_ROW_GROUP_SIZE)
+    parser.add_argument("--incremental", help="Only export findings updated since the last run, appending to filename",
+                        action='store_true')
+    parser.add_argument("--state-file", help="Where to keep the --incremental watermarks")
+    parser.add_argument("--export-source", help="Read exported findings from this s3://bucket/prefix or local directory "
+                        "instead of calling the Macie API")
+    parser.add_argument("--batches-in-flight", help="Number of get_findings calls to run at once",
+                        type=int, default=DEFAULT_BATCHES_IN_FLIGHT)
+    add_common_args(parser)
+
+    args = parser.parse_args()
+
+    return(args)
+
+
+if __name__ == '__main__':
+
+    args = do_args()
+
+    if args.incremental and args.export_source:
+        # Exported files aren't in updatedAt order, so there's no watermark to keep
+        print("--incremental can't be used with --export-source")
+        exit(1)
+    if args.incremental and (args.format or format_for(args.filename)) == 'parquet':
+        print("--incremental can't append to a parquet file")
+        exit(1)
+
+    # Logging idea stolen from: https://docs.python.org/3/howto/logging.html#configuring-logging
+    # create console handler and set level to debug
+    ch = logging.StreamHandler()
+    if args.error:
+        logger.setLevel(logging.ERROR)
+    elif args.debug:
+        logger.setLevel(logging.DEBUG)
+    else:
+        logger.setLevel(logging.INFO)
+
+    # create formatter
+    # formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    formatter = logging.Formatter('%(name)s - %(levelname)s - %(message)s')
+    # add formatter to ch
+    ch.setFormatter(formatter)
+    # add ch to logger
+    logger.addHandler(ch)
+
+    # # Sanity check region
+    # if args.region:
+    #     os.environ['AWS_DEFAULT_REGION'] = args.region
+
+    # if 'AWS_DEFAULT_REGION' not in os.environ:
+    #     logger.error("AWS_DEFAULT_REGION Not set. Aborting...")
+    #     exit(1)
+
+    start_common(args)
+
+    try:
+        main(args, logger)
+    except KeyboardInterrupt:
+        exit(1)
+    except ImportError as e:
+        # An optional dependency of the output format (pyarrow for parquet) isn't installed
+        logger.error(e)
+        exit(1)
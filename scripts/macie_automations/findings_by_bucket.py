@@ -0,0 +1,133 @@
+#
+# Get stats on findings for a specific bucket or all buckets.
+#
+
+from macie_automations.macie_clients import get_client, add_common_args, start_common
+from macie_automations.macie_fanout import fan_out, report_errors
+from macie_automations.macie_findings import get_counts_by_bucket, FINDING_TYPES
+from macie_automations.macie_regions import resolve_regions
+
+import logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+logging.getLogger('botocore').setLevel(logging.WARNING)
+logging.getLogger('boto3').setLevel(logging.WARNING)
+logging.getLogger('urllib3').setLevel(logging.WARNING)
+
+
+SEVERITIES = ['High', 'Medium', 'Low']
+
+
+def main(args, logger):
+
+    # Macie is regional even though buckets aren't. So we need to iterate across regions to find out bucket
+    # Unless you know already
+    regions = resolve_regions(args)
+
+    severities = SEVERITIES
+    if args.severity:
+        severities = [args.severity]
+
+    region_results = fan_out(get_bucket_counts, regions, args, severities, max_workers=args.max_workers)
+
+    # Merge everything into one bucket x severity matrix
+    rows = []
+    for region_result in region_results:
+        if region_result.error is not None:
+            continue
+        for (bucket, finding_type), counts in region_result.result.items():
+            rows.append([bucket, region_result.region, finding_type] + [counts.get(s, 0) for s in severities])
+
+    # Most High findings first, then Medium, then Low
+    rows.sort(key=lambda row: [-c for c in row[3:]] + [row[0], row[1], row[2] or ""])
+
+    header = ["Bucket", "Region"]
+    if args.by_type:
+        header.append("Type")
+    header = header + severities + ["Total"]
+    table = [header]
+    for row in rows:
+        line = row[:2]
+        if args.by_type:
+            line.append(row[2])
+        table.append(line + [f"{c:,}" for c in row[3:]] + [f"{sum(row[3:]):,}"])
+
+    widths = [max([len(str(line[i])) for line in table]) for i in range(len(header))]
+    for line in table:
+        print("  ".join([str(c).ljust(widths[i]) if i < 2 + args.by_type else str(c).rjust(widths[i])
+                         for i, c in enumerate(line)]))
+
+    report_errors(region_results)
+
+
+def get_bucket_counts(r, args, severities):
+    """Return {(bucket, finding type or None): {severity: count}} for this region."""
+    macie_client = get_client('macie2', r)
+    accounts = []
+
+    finding_types = [None]
+    if args.by_type:
+        finding_types = FINDING_TYPES
+
+    output = {}
+    for severity in severities:
+        for finding_type in finding_types:
+            criterion = {
+                'category': {'eq': ['CLASSIFICATION']},
+                'severity.description': {'eq': [severity]}
+            }
+            if args.bucket:
+                criterion['resourcesAffected.s3Bucket.name'] = {'eq': [args.bucket]}
+            if finding_type:
+                criterion['type'] = {'eq': [finding_type]}
+
+            for group in get_counts_by_bucket(macie_client, r, criterion, accounts):
+                counts = output.setdefault((group['groupKey'], finding_type), {})
+                counts[severity] = counts.get(severity, 0) + group['count']
+
+    logger.debug(f"Found findings in {len(output)} buckets in {r}")
+    return(output)
+
+
+def do_args():
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--debug", help="print debugging info", action='store_true')
+    parser.add_argument("--error", help="print error info only", action='store_true')
+    parser.add_argument("--region", help="Only Process this region")
+    parser.add_argument("--bucket", help="Only price out this bucket")
+    parser.add_argument("--severity", help="Only report on this severity", choices=SEVERITIES)
+    parser.add_argument("--by-type", help="Break the counts down by finding type too", action='store_true')
+    add_common_args(parser)
+    args = parser.parse_args()
+    return(args)
+
+
+if __name__ == '__main__':
+
+    args = do_args()
+
+    # Logging idea stolen from: https://docs.python.org/3/howto/logging.html#configuring-logging
+    # create console handler and set level to debug
+    ch = logging.StreamHandler()
+    if args.error:
+        logger.setLevel(logging.ERROR)
+    elif args.debug:
+        logger.setLevel(logging.DEBUG)
+    else:
+        logger.setLevel(logging.INFO)
+
+    # create formatter
+    # formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    formatter = logging.Formatter('%(name)s - %(levelname)s - %(message)s')
+    # add formatter to ch
+    ch.setFormatter(formatter)
+    # add ch to logger
+    logger.addHandler(ch)
+
+    start_common(args)
+
+    try:
+        main(args, logger)
+    except KeyboardInterrupt:
+        exit(1)
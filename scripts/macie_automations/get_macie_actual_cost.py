@@ -0,0 +1,150 @@
+#
+# Script to get the price of enabling Macie for all Public Buckets, or for a specific Bucket.
+# With --by-account, what each member account has cost, for chargeback.
+# Each run's costs are saved to a local history, see cost_trend.py.
+#
+
+import csv
+
+from macie_automations.macie_clients import add_common_args, start_common
+from macie_automations.macie_cost_history import open_cost_history, record_costs, ALL_ACCOUNTS
+from macie_automations.macie_fanout import fan_out, report_errors
+from macie_automations.macie_regions import resolve_regions
+from macie_automations.macie_usage import get_usage_totals, get_account_costs, merge_account_costs, roll_up, USAGE_COLUMNS
+
+import logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+logging.getLogger('botocore').setLevel(logging.WARNING)
+logging.getLogger('boto3').setLevel(logging.WARNING)
+logging.getLogger('urllib3').setLevel(logging.WARNING)
+
+TIMERANGE = {
+    "MONTH_TO_DATE": "month to date",
+    "PAST_30_DAYS": "in the past 30 days"
+}
+
+
+def main(args, logger):
+    # Macie is regional even though buckets aren't.
+    # So we need to iterate across regions to find our bucket
+    # Unless you know already
+    regions = resolve_regions(args)
+
+    if args.by_account or args.csv:
+        costs_by_account(args, regions)
+        return
+
+    # variables to store the global size and cost
+    total_cost = 0
+    costs = {}
+
+    region_results = fan_out(get_usage_totals, regions, args.timerange, max_workers=args.max_workers)
+
+    for region_result in region_results:
+        if region_result.error is not None:
+            continue
+        r = region_result.region
+        for t in region_result.result:
+            if float(t['estimatedCost']) == 0:
+                continue
+            print(f"Cost of Macie {t['type']} in {r} is estimated to be ${float(t['estimatedCost']):,} {TIMERANGE[args.timerange]}")
+            total_cost += float(t['estimatedCost'])
+            costs[(ALL_ACCOUNTS, r, t['type'])] = float(t['estimatedCost'])
+
+    print(f"Total Cost: US${int(total_cost):,} {TIMERANGE[args.timerange]}")
+    save_history(args, costs, region_results, by_account=False)
+    report_errors(region_results)
+
+
+def save_history(args, costs, region_results, by_account):
+    # A region that failed keeps whatever it had saved for today
+    if args.no_history:
+        return
+    regions = [region_result.region for region_result in region_results if region_result.error is None]
+    db = open_cost_history(args.history_db)
+    record_costs(db, costs, args.timerange, regions, by_account)
+    db.close()
+
+
+def costs_by_account(args, regions):
+    # One paginated get_usage_statistics per region, all the regions at once
+    region_results = fan_out(get_account_costs, regions, args.timerange, max_workers=args.max_workers)
+    costs = merge_account_costs(region_results)
+    rows = roll_up(costs, args.group_by)
+    total_cost = sum([cost for key, cost in rows])
+
+    if args.csv:
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(args.group_by + ['cost'])
+            for key, cost in rows:
+                writer.writerow(list(key) + [f"{cost:.2f}"])
+        logger.info(f"Wrote {len(rows):,} rows to {args.csv}")
+    else:
+        widths = {'account': 14, 'region': 16, 'type': 36}
+        print(" ".join([f"{c.title():<{widths[c]}}" for c in args.group_by]) + f" {'Cost':>12} {'Share':>6}")
+        for key, cost in rows[:args.top]:
+            share = 100 * cost / total_cost if total_cost else 0
+            print(" ".join([f"{k:<{widths[c]}}" for c, k in zip(args.group_by, key)]) + f" {cost:>12,.2f} {share:>5.1f}%")
+
+    accounts = len(set([account_id for account_id, r, usage_type in costs]))
+    print(f"Total Cost: US${total_cost:,.2f} across {accounts:,} accounts {TIMERANGE[args.timerange]}")
+    save_history(args, costs, region_results, by_account=True)
+    report_errors(region_results)
+
+
+def do_args():
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--debug", help="print debugging info", action='store_true')
+    parser.add_argument("--error", help="print error info only", action='store_true')
+    parser.add_argument("--region", help="Only run in this region")
+    parser.add_argument("--timerange", help="Query for this timeRange", choices=['MONTH_TO_DATE', 'PAST_30_DAYS'], default='MONTH_TO_DATE')
+    parser.add_argument("--by-account", help="Break the cost down by member account", action='store_true')
+    parser.add_argument("--group-by", help=f"With --by-account, comma separated columns to add up the cost by, from {', '.join(USAGE_COLUMNS)}",
+                        default="account")
+    parser.add_argument("--top", help="With --by-account, how many rows of the table to show", type=int)
+    parser.add_argument("--csv", help="Write the --by-account costs to this CSV file instead of a table")
+    parser.add_argument("--history-db", help="Save today's costs to this cost history database for cost_trend.py "
+                        "(default: one per AWS profile in the cache directory)")
+    parser.add_argument("--no-history", help="Don't save today's costs to the cost history", action='store_true')
+    add_common_args(parser)
+    args = parser.parse_args()
+    return(args)
+
+
+if __name__ == '__main__':
+
+    args = do_args()
+
+    args.group_by = args.group_by.split(",")
+    for column in args.group_by:
+        if column not in USAGE_COLUMNS:
+            print(f"--group-by {column} isn't one of {', '.join(USAGE_COLUMNS)}")
+            exit(1)
+
+    # Logging idea stolen from: https://docs.python.org/3/howto/logging.html#configuring-logging
+    # create console handler and set level to debug
+    ch = logging.StreamHandler()
+    if args.error:
+        logger.setLevel(logging.ERROR)
+    elif args.debug:
+        logger.setLevel(logging.DEBUG)
+    else:
+        logger.setLevel(logging.INFO)
+
+    # create formatter
+    # formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    formatter = logging.Formatter('%(name)s - %(levelname)s - %(message)s')
+    # add formatter to ch
+    ch.setFormatter(formatter)
+    # add ch to logger
+    logger.addHandler(ch)
+
+    start_common(args)
+
+    try:
+        main(args, logger)
+    except KeyboardInterrupt:
+        exit(1)
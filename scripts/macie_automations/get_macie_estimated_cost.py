@@ -0,0 +1,263 @@
+#
+# Script to get the price of enabling Macie for all Public Buckets, or for a specific Bucket.
+# Or for all the buckets, or the ones in some accounts, with some tags, encryption or shared access.
+# With --weekly, what a weekly job that only scans new and changed objects will cost a month.
+#
+
+import json
+import time
+
+from macie_automations.macie_clients import add_common_args, start_common
+from macie_automations.macie_fanout import fan_out, report_errors
+from macie_automations.macie_inventory import open_inventory, refresh_inventory, lookup_bucket, get_buckets, get_bucket_statistics, statistics_accounts
+from macie_automations.macie_inventory import bucket_growth, epoch, DEFAULT_GROWTH_DAYS
+from macie_automations.macie_pricing import DIVISOR, scan_cost, weekly_scan_cost
+from macie_automations.macie_regions import resolve_regions
+
+import logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+logging.getLogger('botocore').setLevel(logging.WARNING)
+logging.getLogger('boto3').setLevel(logging.WARNING)
+logging.getLogger('urllib3').setLevel(logging.WARNING)
+
+# mapping needed to filter to only public buckets
+PUBLIC_CRITERIA = {
+  "publicAccess.effectivePermission": {
+    "eq": ["PUBLIC"]
+  }
+}
+
+# Days of size history needed before a bucket's growth is believed
+MIN_HISTORY_DAYS = 3
+
+
+def main(args, logger):
+
+    # variables to store the global size and cost
+    total_cost = 0
+    total_size = 0
+
+    # Macie is regional even though buckets aren't.
+    # So we need to iterate across regions to find our bucket
+    # Unless you know already
+    regions = resolve_regions(args)
+
+    db = open_inventory()
+
+    if args.bucket:
+        r, bucket_info = lookup_bucket(db, args.bucket, regions, live=args.live, max_workers=args.max_workers)
+        if bucket_info is None:
+            logger.error(f"Unable to find {args.bucket} in {regions}")
+            exit(1)
+        logger.debug(f"Found {args.bucket} in {r}")
+        if args.weekly:
+            weekly, basis = weekly_bytes(args.bucket, bucket_info['classifiableSizeInBytes'], bucket_info.get('bucketCreatedAt'),
+                                         bucket_growth(db, args.history_days), args)
+            print(f"Weekly Macie Scan of {args.bucket} will cost about ${weekly_scan_cost(weekly, args.sample):,.2f} a month "
+                  f"({weekly/DIVISOR:,.1f} GB new or changed a week, from {basis})")
+            exit(0)
+        print(f"Macie Scan cost of {args.bucket} is ${int(get_bucket_cost(bucket_info, args.sample)):,} (size {int(bucket_info['classifiableSizeInBytes']/DIVISOR):,} GB - {bucket_info['classifiableObjectCount']:,} objects)")
+        exit(0)
+
+    criteria = build_criteria(args)
+    label = "Public Scan" if criteria == PUBLIC_CRITERIA else "Scan"
+    logger.debug(f"Bucket criteria: {criteria}")
+
+    if args.weekly:
+        weekly_estimate(args, db, regions, criteria)
+        return
+
+    # If Macie can add the buckets up for us there's no need to look at them one by one
+    account_ids = statistics_accounts(criteria)
+    if account_ids is not None and not args.by_bucket:
+        region_results = fan_out(get_bucket_statistics, regions, account_ids, max_workers=args.max_workers)
+        for region_result in region_results:
+            if region_result.error is not None:
+                continue
+            regional_size = region_result.result['classifiableSizeInBytes']
+            regional_cost = scan_cost(regional_size, args.sample)
+            print(f"{label} in {region_result.region} will cost US${int(regional_cost):,} size: {int(regional_size/DIVISOR):,} GB for {region_result.result['bucketCount']} buckets")
+            total_cost += regional_cost
+            total_size += regional_size
+        print(f"Total Cost: US${int(total_cost):,} Total Size: {int(total_size/DIVISOR):,}GB")
+        report_errors(region_results)
+        return
+
+    # Answer from the bucket inventory, only going to Macie for regions that are out of date
+    region_results = refresh_inventory(db, regions, force=args.live, max_workers=args.max_workers)
+    failed = [region_result.region for region_result in region_results if region_result.error is not None]
+    buckets = []
+    for r in regions:
+        if r in failed:
+            continue
+        regional_size = 0
+        regional_count = 0
+        for b in get_buckets(db, region=r, criteria=criteria):
+            regional_size += b['classifiable_size_in_bytes']
+            regional_count += 1
+            buckets.append(b)
+        regional_cost = scan_cost(regional_size, args.sample)
+
+        print(f"{label} in {r} will cost US${int(regional_cost):,} size: {int(regional_size/DIVISOR):,} GB for {regional_count} buckets")
+
+        total_cost += regional_cost
+        total_size += regional_size
+
+    if args.by_bucket:
+        buckets.sort(key=lambda b: -b['classifiable_size_in_bytes'])
+        print(f"\n{'Bucket':<64} {'Region':<16} {'Account':<14} {'Objects':>12} {'GB':>10} {'Cost':>10}")
+        for b in buckets[:args.top]:
+            print(f"{b['bucket_name']:<64} {b['region']:<16} {b['account_id']:<14} {b['classifiable_object_count']:>12,} "
+                  f"{int(b['classifiable_size_in_bytes']/DIVISOR):>10,} {scan_cost(b['classifiable_size_in_bytes'], args.sample):>10,.2f}")
+        print()
+
+    print(f"Total Cost: US${int(total_cost):,} Total Size: {int(total_size/DIVISOR):,}GB")
+    report_errors(region_results)
+
+
+def weekly_estimate(args, db, regions, criteria):
+    # A weekly job only scans what's been added or changed since the last run, so price that, not the buckets
+    region_results = refresh_inventory(db, regions, force=args.live, max_workers=args.max_workers)
+    failed = [region_result.region for region_result in region_results if region_result.error is not None]
+    growth = bucket_growth(db, args.history_days)
+    total_weekly = 0
+    total_size = 0
+    buckets = []
+    for r in regions:
+        if r in failed:
+            continue
+        regional_weekly = 0
+        regional_count = 0
+        for b in get_buckets(db, region=r, criteria=criteria):
+            bucket_info = json.loads(b['bucket_info'])
+            weekly, basis = weekly_bytes(b['bucket_name'], b['classifiable_size_in_bytes'], bucket_info.get('bucketCreatedAt'), growth, args)
+            regional_weekly += weekly
+            regional_count += 1
+            total_size += b['classifiable_size_in_bytes']
+            buckets.append((b, weekly, basis))
+        print(f"Weekly Scan in {r} will cost about US${weekly_scan_cost(regional_weekly, args.sample):,.2f} a month: "
+              f"{regional_weekly/DIVISOR:,.1f} GB new or changed a week in {regional_count} buckets")
+        total_weekly += regional_weekly
+
+    if args.by_bucket:
+        buckets.sort(key=lambda b: -b[1])
+        print(f"\n{'Bucket':<64} {'Region':<16} {'GB':>10} {'GB a Week':>10} {'A Month':>10}  Change rate from")
+        for b, weekly, basis in buckets[:args.top]:
+            print(f"{b['bucket_name']:<64} {b['region']:<16} {int(b['classifiable_size_in_bytes']/DIVISOR):>10,} "
+                  f"{weekly/DIVISOR:>10,.1f} {weekly_scan_cost(weekly, args.sample):>10,.2f}  {basis}")
+        print()
+
+    unknown = len([b for b in buckets if b[2] == "unknown"])
+    if unknown:
+        logger.warning(f"No change rate for {unknown} buckets, counted as not changing. Use --change-rate to assume one")
+    print(f"Total Cost: about US${weekly_scan_cost(total_weekly, args.sample):,.2f} a month, {total_weekly/DIVISOR:,.1f} GB a week "
+          f"(scanning all {int(total_size/DIVISOR):,}GB once would cost US${scan_cost(total_size, args.sample):,.2f})")
+    report_errors(region_results)
+
+
+def weekly_bytes(bucket_name, size, created_at, growth, args):
+    """Return (bytes added or changed a week, where that came from) for a bucket.
+
+    In order: the --change-rate given, how fast the bucket has grown in the inventory's history, or how
+    fast it has grown on average since it was created."""
+    if args.change_rate is not None:
+        return(size * args.change_rate / 100, f"--change-rate {args.change_rate}%")
+    if bucket_name in growth:
+        per_day, days = growth[bucket_name]
+        if days >= MIN_HISTORY_DAYS:
+            return(per_day * 7, f"{days:.0f} days of history")
+    if created_at is not None:
+        age = (time.time() - epoch(created_at)) / (24 * 60 * 60)
+        if age >= MIN_HISTORY_DAYS:
+            return(size / age * 7, f"average since created {age:.0f} days ago")
+    return(0, "unknown")
+
+
+def build_criteria(args):
+    # describe_buckets style criteria for the buckets to price out. Public buckets unless told otherwise.
+    criteria = {}
+    if not args.all_buckets:
+        criteria.update(PUBLIC_CRITERIA)
+    if args.account_id:
+        criteria['accountId'] = {'eq': args.account_id.split(",")}
+    if args.shared_access:
+        criteria['sharedAccess'] = {'eq': [args.shared_access]}
+    if args.encryption:
+        criteria['serverSideEncryption.type'] = {'eq': [args.encryption]}
+    if args.tag:
+        criteria['tags'] = {'eq': args.tag}
+    if args.criteria:
+        criteria.update(json.loads(args.criteria))
+    return(criteria)
+
+
+def get_bucket_cost(bucket_info, sample=100):
+
+    cost = scan_cost(bucket_info['classifiableSizeInBytes'], sample)
+
+    logger.debug(f"Macie Scan cost of {bucket_info['bucketName']} is ${int(cost):,} (size {int(bucket_info['classifiableSizeInBytes']/DIVISOR):,} GB - {bucket_info['classifiableObjectCount']:,} objects)")
+
+    return(cost)
+
+
+def do_args():
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--debug", help="print debugging info", action='store_true')
+    parser.add_argument("--error", help="print error info only", action='store_true')
+    parser.add_argument("--region", help="Only run in this region")
+    parser.add_argument("--bucket", help="Only price out this bucket")
+    parser.add_argument("--live", help="Refresh the bucket inventory from Macie before answering", action='store_true')
+    parser.add_argument("--all-buckets", help="Price out every bucket, not just the public ones", action='store_true')
+    parser.add_argument("--account-id", help="Only price out buckets in these comma separated accounts")
+    parser.add_argument("--shared-access", help="Only price out buckets shared this way",
+                        choices=['EXTERNAL', 'INTERNAL', 'NOT_SHARED', 'UNKNOWN'])
+    parser.add_argument("--encryption", help="Only price out buckets with this default encryption",
+                        choices=['NONE', 'AES256', 'aws:kms', 'aws:kms:dsse'])
+    parser.add_argument("--tag", help="Only price out buckets with this tag, as key:value. Repeat for any of several",
+                        action='append')
+    parser.add_argument("--criteria", help="Only price out buckets that meet these describe_buckets criteria, as JSON. "
+                        "e.g. '{\"objectCount\": {\"gt\": 1000}}'")
+    parser.add_argument("--sample", help="Percentage of objects the job will randomly scan", type=int, default=100)
+    parser.add_argument("--weekly", help="Price a weekly job, which only scans objects added or changed since its last run",
+                        action='store_true')
+    parser.add_argument("--history-days", help="With --weekly, how many days of bucket size history to work growth out from",
+                        type=int, default=DEFAULT_GROWTH_DAYS)
+    parser.add_argument("--change-rate", help="With --weekly, assume this percentage of each bucket is new or changed every week",
+                        type=float)
+    parser.add_argument("--by-bucket", help="List the cost of each bucket, most expensive first", action='store_true')
+    parser.add_argument("--top", help="With --by-bucket, how many buckets to list", type=int)
+    add_common_args(parser)
+    args = parser.parse_args()
+    return(args)
+
+
+if __name__ == '__main__':
+
+    args = do_args()
+
+    # Logging idea stolen from: https://docs.python.org/3/howto/logging.html#configuring-logging
+    # create console handler and set level to debug
+    ch = logging.StreamHandler()
+    if args.error:
+        logger.setLevel(logging.ERROR)
+    elif args.debug:
+        logger.setLevel(logging.DEBUG)
+    else:
+        logger.setLevel(logging.INFO)
+
+    # create formatter
+    # formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    formatter = logging.Formatter('%(name)s - %(levelname)s - %(message)s')
+    # add formatter to ch
+    ch.setFormatter(formatter)
+    # add ch to logger
+    logger.addHandler(ch)
+
+    start_common(args)
+
+    try:
+        main(args, logger)
+    except KeyboardInterrupt:
+        exit(1)
@@ -0,0 +1,114 @@
+#
+# Script to hit all the regions and get status of classification jobs
+#
+
+from macie_automations.macie_clients import add_common_args, start_common
+from macie_automations.macie_fanout import fan_out, report_errors
+from macie_automations.macie_jobs import list_jobs, describe_jobs, PUBLIC_CRITERIA
+from macie_automations.macie_regions import resolve_regions
+
+import logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+logging.getLogger('botocore').setLevel(logging.WARNING)
+logging.getLogger('boto3').setLevel(logging.WARNING)
+logging.getLogger('urllib3').setLevel(logging.WARNING)
+
+
+def main(args, logger):
+
+    # Macie is regional so we need to iterate across regions
+    regions = resolve_regions(args)
+
+    # API will allow filtering, we can combine if we want
+    # Ref: https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/macie2.html#Macie2.Client.list_classification_jobs
+    filter = {'includes': []}
+    if args.status:
+        filter['includes'].append({'comparator': 'EQ', 'key': 'jobStatus', 'values': [args.status]})
+    if args.weekly:
+        filter['includes'].append({'comparator': 'EQ', 'key': 'jobType', 'values': ['SCHEDULED']})
+    if args.onetime:
+        filter['includes'].append({'comparator': 'EQ', 'key': 'jobType', 'values': ['ONE_TIME']})
+
+    region_results = fan_out(list_jobs, regions, filter, max_workers=args.max_workers)
+
+    details = {}
+    if args.details:
+        jobs = {}
+        for region_result in region_results:
+            if region_result.error is None:
+                jobs.update({j['jobId']: region_result.region for j in region_result.result})
+        details = describe_jobs(jobs, max_workers=args.max_workers)
+
+    for region_result in region_results:
+        if region_result.error is not None:
+            continue
+        r = region_result.region
+        for j in region_result.result:
+            stats = format_details(details.get(j['jobId']))
+            if 'bucketCriteria' in j and j['bucketCriteria'] == PUBLIC_CRITERIA['bucketCriteria']:
+                print(f"{j['name']} in {r} type {j['jobType']} status {j['jobStatus']} Created {j['createdAt'].date()} for public buckets {j['jobId']}{stats}")
+            elif 'bucketDefinitions' in j:
+                for bd in j['bucketDefinitions']:
+                    print(f"{j['name']} in {r} type {j['jobType']} status {j['jobStatus']} Created {j['createdAt'].date()} for {bd['buckets']} in account {bd['accountId']}{stats}")
+            else:
+                print(f"{j['name']} in {r} type {j['jobType']} status {j['jobStatus']} Created {j['createdAt'].date()} is a one-off job{stats}")
+
+    report_errors(region_results)
+
+
+def format_details(d):
+    if d is None:
+        return("")
+    output = f" - {d['numberOfRuns']} runs, ~{d['approximateNumberOfObjectsToProcess']:,} objects to process"
+    if d['lastRunTime']:
+        output += f", last run {d['lastRunTime']}"
+    if d['lastRunErrorStatus'] != "NONE":
+        output += " with errors"
+    return(output)
+
+
+def do_args():
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--debug", help="print debugging info", action='store_true')
+    parser.add_argument("--error", help="print error info only", action='store_true')
+    parser.add_argument("--region", help="Only run in this region")
+    parser.add_argument("--status", help="Filter to show only this status",
+                        choices=['RUNNING', 'PAUSED', 'CANCELLED', 'COMPLETE', 'IDLE', 'USER_PAUSED'])
+    parser.add_argument("--weekly", help="Filter to show only weekly scan job of new objects", action='store_true')
+    parser.add_argument("--onetime", help="Filter to show only one time scan of all objects", action='store_true')
+    parser.add_argument("--details", help="Describe each job to show its statistics and last run", action='store_true')
+    add_common_args(parser)
+    args = parser.parse_args()
+    return(args)
+
+
+if __name__ == '__main__':
+
+    args = do_args()
+
+    # Logging idea stolen from: https://docs.python.org/3/howto/logging.html#configuring-logging
+    # create console handler and set level to debug
+    ch = logging.StreamHandler()
+    if args.error:
+        logger.setLevel(logging.ERROR)
+    elif args.debug:
+        logger.setLevel(logging.DEBUG)
+    else:
+        logger.setLevel(logging.INFO)
+
+    # create formatter
+    # formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    formatter = logging.Formatter('%(name)s - %(levelname)s - %(message)s')
+    # add formatter to ch
+    ch.setFormatter(formatter)
+    # add ch to logger
+    logger.addHandler(ch)
+
+    start_common(args)
+
+    try:
+        main(args, logger)
+    except KeyboardInterrupt:
+        exit(1)
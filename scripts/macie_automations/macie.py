@@ -0,0 +1,131 @@
+#
+# One command for all of the scripts: `macie list-jobs`, `macie estimated-cost --bucket foo`, and so on.
+# Each command runs the script it's named for, with the same arguments.
+#
+# Only the script for the command given is imported, and boto3 isn't imported until the first AWS call,
+# so `macie --help` and `macie <command> --help` don't load the AWS SDK at all. `macie startup-time`
+# checks that every command gets as far as its --help within the startup budget, to catch a heavy import
+# creeping back in at module level.
+#
+
+import os
+import sys
+
+# command: (script module, description)
+COMMANDS = {
+    'enable': ('enable_macie', "Configure the delegated admin account and members for Macie"),
+    'inventory': ('bucket_inventory', "Snapshot Macie's bucket inventory into a local database"),
+    'estimated-cost': ('get_macie_estimated_cost', "Estimate the cost of scanning buckets"),
+    'plan-budget': ('plan_scan_budget', "Pick buckets and sampling to fit a dollar budget"),
+    'create-job': ('create_scan_job', "Create classification jobs, or plan them"),
+    'list-jobs': ('list_classification_jobs', "Show the status of every classification job"),
+    'watch-jobs': ('watch_jobs', "Watch running jobs with an ETA for each"),
+    'findings-by-bucket': ('findings_by_bucket', "Findings by bucket and severity"),
+    'top-findings': ('top_findings', "Buckets, prefixes, extensions and categories with the most findings"),
+    'query-findings': ('query_findings', "Load findings into memory and count them any way you like"),
+    'extract-findings': ('extract_findings_to_csv', "Export findings to CSV, JSONL, Parquet or SQLite"),
+    'actual-cost': ('get_macie_actual_cost', "What Macie has cost so far"),
+    'cost-trend': ('cost_trend', "Day to day cost changes and spikes, from the saved cost history"),
+}
+
+# How long a command may take to get as far as printing its --help, in milliseconds. The scripts manage it
+# in under 100ms, importing boto3 alone takes longer than this.
+STARTUP_BUDGET_MS = 150
+
+# Imports that shouldn't happen just to start up
+HEAVY_MODULES = ['boto3', 'botocore', 'dateutil', 'urllib3']
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if len(argv) == 0 or argv[0] in ['-h', '--help']:
+        print_usage(sys.stdout)
+        return(0)
+
+    command = argv[0]
+    if command == "startup-time":
+        return(startup_time(argv[1:]))
+    if command not in COMMANDS:
+        print(f"macie: unknown command {command}\n", file=sys.stderr)
+        print_usage(sys.stderr)
+        return(2)
+    run(command, argv[1:])
+    return(0)
+
+
+def run(command, argv):
+    """Run the script for command as if it had been called with argv."""
+    import runpy
+    module = COMMANDS[command][0]
+    # argparse takes the program name for its usage message from argv[0]
+    sys.argv = [f"macie {command}"] + argv
+    runpy.run_module(f"{__package__}.{module}", run_name='__main__')
+
+
+def print_usage(file):
+    print("usage: macie <command> [--help] [arguments]\n\ncommands:", file=file)
+    for command, (module, description) in COMMANDS.items():
+        print(f"  {command:<20} {description}", file=file)
+    print(f"  {'startup-time':<20} Check every command starts within the startup budget", file=file)
+
+
+def startup_time(argv):
+    """Time each command's --help in a fresh interpreter. Returns 1 if any are over budget or import any
+    of HEAVY_MODULES."""
+    import argparse
+    import subprocess
+    import time
+    parser = argparse.ArgumentParser(prog="macie startup-time")
+    parser.add_argument("commands", help="Only time these commands", nargs='*')
+    parser.add_argument("--budget", help="Startup budget in milliseconds", type=int, default=STARTUP_BUDGET_MS)
+    parser.add_argument("--runs", help="Time each command this many times and take the fastest", type=int, default=5)
+    args = parser.parse_args(argv)
+    for command in args.commands:
+        if command not in COMMANDS:
+            parser.error(f"unknown command {command}")
+
+    def fastest(cmd):
+        best = None
+        for i in range(args.runs):
+            start = time.perf_counter()
+            result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, env=env)
+            elapsed = (time.perf_counter() - start) * 1000
+            if best is None or elapsed < best:
+                best = elapsed
+        return(best, result)
+
+    # Run the package from wherever this copy of it is, installed or not
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([os.path.dirname(os.path.dirname(os.path.abspath(__file__)))]
+                                        + [p for p in [env.get('PYTHONPATH')] if p])
+
+    interpreter, result = fastest([sys.executable, "-c", "pass"])
+    print(f"Python itself starts in {interpreter:.0f}ms. Budget is {args.budget}ms\n")
+    print(f"{'Command':<20} {'Startup':>8}  {'Status':<12} Heavy imports")
+
+    over = 0
+    for command in args.commands or COMMANDS:
+        elapsed, result = fastest([sys.executable, "-X", "importtime", "-m", f"{__package__}.macie", command, "--help"])
+        # -X importtime lines look like "import time:  self [us] | cumulative | module", nested modules indented
+        imported = set([line.split("|")[-1].strip() for line in result.stderr.splitlines() if line.startswith("import time:")])
+        heavy = [m for m in HEAVY_MODULES if m in imported]
+        status = "ok"
+        if result.returncode != 0:
+            status = f"FAILED ({result.returncode})"
+        elif elapsed > args.budget:
+            status = "OVER BUDGET"
+        elif heavy:
+            status = "HEAVY"
+        if status != "ok":
+            over += 1
+        print(f"{command:<20} {elapsed:>6.0f}ms  {status:<12} {', '.join(heavy) or '-'}")
+
+    if over:
+        print(f"\n{over} command(s) failed, went over the {args.budget}ms budget or imported the AWS SDK")
+        return(1)
+    return(0)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
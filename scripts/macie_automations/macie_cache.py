@@ -0,0 +1,59 @@
+#
+# Small on-disk JSON cache shared by the scripts. Lives in ~/.cache/aws-macie-automations unless
+# MACIE_CACHE_DIR is set.
+#
+
+import json
+import os
+import tempfile
+import time
+
+import logging
+logger = logging.getLogger()
+
+
+def cache_dir():
+    """Return the directory to keep cached data in, creating it if needed."""
+    path = os.environ.get('MACIE_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'aws-macie-automations'))
+    os.makedirs(path, exist_ok=True)
+    return(path)
+
+
+def cache_path(name):
+    # An absolute path is used as-is
+    return(os.path.join(cache_dir(), name))
+
+
+def profile_name():
+    """Name of the AWS profile in use, so caches from different accounts don't get mixed up."""
+    return(os.environ.get('AWS_PROFILE', os.environ.get('AWS_DEFAULT_PROFILE', 'default')))
+
+
+def load_json(name, ttl=None):
+    """Return the cached data for name, or None if it's missing, unreadable, or older than ttl seconds."""
+    path = cache_path(name)
+    try:
+        if ttl is not None and time.time() - os.path.getmtime(path) > ttl:
+            logger.debug(f"Cache {path} is older than {ttl} seconds")
+            return(None)
+        with open(path) as f:
+            return(json.load(f))
+    except FileNotFoundError:
+        return(None)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable cache {path}: {e}")
+        return(None)
+
+
+def save_json(name, data):
+    """Atomically write data to the cache so a crash or a concurrent run never sees half a file."""
+    path = cache_path(name)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f".{os.path.basename(path)}.")
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=2, default=str)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return(path)
@@ -0,0 +1,188 @@
+#
+# Record every AWS API response to a cassette directory, and replay them later without touching the
+# network. Handy for re-running a report while tuning it, and for benchmarking.
+#
+#   MACIE_RECORD=dir ./findings_by_bucket.py       # record
+#   MACIE_REPLAY=dir ./findings_by_bucket.py       # replay
+#   MACIE_REPLAY=dir MACIE_REPLAY_LATENCY=1 ...    # replay, sleeping as long as each call took when recorded
+#
+# Calls are matched on service, operation, region and parameters. The same call made more than once (a
+# job being polled, say) is replayed in the order it was recorded, repeating the last answer once they
+# run out. Hooks into botocore's before-call / after-call events, the same way botocore's Stubber does.
+#
+
+import base64
+import datetime
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+
+import logging
+logger = logging.getLogger()
+
+# Parameters that are different every run and don't change the answer
+VOLATILE_PARAMS = ['clientToken']
+
+
+class CassetteMiss(Exception):
+    """Replay was asked for a call that was never recorded."""
+
+
+class ReplayedResponse(object):
+    # Just enough of an HTTP response for botocore to decide whether to raise the recorded error
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {}
+        self.content = b''
+
+
+class Cassette(object):
+
+    def __init__(self, path, mode, latency=0):
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.interactions = {}
+        self.played = {}
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def attach(self, client):
+        client.meta.events.register('before-parameter-build', self.before_parameter_build)
+        if self.mode == "record":
+            client.meta.events.register('before-call', self.start_timer)
+            client.meta.events.register('after-call', self.record)
+        else:
+            client.meta.events.register('before-call', self.replay)
+        return(client)
+
+    def before_parameter_build(self, params, model, context, **kwargs):
+        # Work out which recording this call belongs to while we still have the parameters as the caller passed them
+        key = {
+            'service': model.service_model.service_name,
+            'operation': model.name,
+            'region': context.get('client_region'),
+            'params': {k: v for k, v in params.items() if k not in VOLATILE_PARAMS}
+        }
+        digest = hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()[:16]
+        context['cassette_key'] = f"{key['service']}.{key['operation']}.{digest}"
+        context['cassette_params'] = key
+
+    def start_timer(self, context, **kwargs):
+        context['cassette_start'] = time.monotonic()
+
+    def record(self, http_response, parsed, context, **kwargs):
+        from botocore.response import StreamingBody
+        start = context.get('cassette_start')
+        latency = time.monotonic() - start if start is not None else 0
+        response = encode(parsed)
+        if 'Body' in parsed and isinstance(parsed['Body'], StreamingBody):
+            # Read the body for the cassette, and give the caller a fresh copy to read
+            data = parsed['Body'].read()
+            parsed['Body'] = StreamingBody(io.BytesIO(data), len(data))
+            response['Body'] = {'__body__': base64.b64encode(data).decode()}
+        interaction = {
+            'request': context['cassette_params'],
+            'status': http_response.status_code,
+            'latency': latency,
+            'response': response
+        }
+        key = context['cassette_key']
+        with self.lock:
+            self.interactions.setdefault(key, []).append(interaction)
+            self.save(key)
+
+    def replay(self, context, model, **kwargs):
+        key = context['cassette_key']
+        with self.lock:
+            if key not in self.interactions:
+                self.interactions[key] = self.load(key)
+            interactions = self.interactions[key]
+            if len(interactions) == 0:
+                raise CassetteMiss(f"No recording of {model.name} with {json.dumps(context['cassette_params'], default=str)} in {self.path}")
+            n = self.played.get(key, 0)
+            self.played[key] = n + 1
+            interaction = interactions[min(n, len(interactions) - 1)]
+        if self.latency:
+            time.sleep(interaction['latency'] * self.latency)
+        return(ReplayedResponse(interaction['status']), decode(interaction['response']))
+
+    def filename(self, key):
+        return(os.path.join(self.path, f"{key}.json"))
+
+    def load(self, key):
+        try:
+            with open(self.filename(key)) as f:
+                return(json.load(f))
+        except FileNotFoundError:
+            return([])
+
+    def save(self, key):
+        # Calls with the same key overwrite what an earlier recording session left
+        tmp_path = self.filename(key) + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.interactions[key], f, indent=1)
+        os.replace(tmp_path, self.filename(key))
+
+
+def encode(value):
+    """Make a parsed response JSON safe, tagging the types JSON doesn't have so decode() can put them back."""
+    from botocore.response import StreamingBody
+    if isinstance(value, dict):
+        return({k: encode(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return([encode(v) for v in value])
+    if isinstance(value, datetime.datetime):
+        return({'__datetime__': value.isoformat()})
+    if isinstance(value, (bytes, bytearray)):
+        return({'__bytes__': base64.b64encode(value).decode()})
+    if isinstance(value, StreamingBody):
+        # record() reads these itself
+        return(None)
+    return(value)
+
+
+def decode(value):
+    from botocore.response import StreamingBody
+    from dateutil.parser import isoparse
+    if isinstance(value, dict):
+        if '__datetime__' in value:
+            return(isoparse(value['__datetime__']))
+        if '__bytes__' in value:
+            return(base64.b64decode(value['__bytes__']))
+        if '__body__' in value:
+            data = base64.b64decode(value['__body__'])
+            return(StreamingBody(io.BytesIO(data), len(data)))
+        return({k: decode(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return([decode(v) for v in value])
+    return(value)
+
+
+_cassette = None
+_cassette_lock = threading.Lock()
+
+
+def get_cassette():
+    """Return the Cassette set up by MACIE_RECORD or MACIE_REPLAY, or None if neither is set."""
+    global _cassette
+    with _cassette_lock:
+        if _cassette is None:
+            if os.environ.get('MACIE_REPLAY'):
+                _cassette = Cassette(os.environ['MACIE_REPLAY'], "replay", float(os.environ.get('MACIE_REPLAY_LATENCY', 0)))
+                logger.info(f"Replaying AWS responses from {_cassette.path}")
+            elif os.environ.get('MACIE_RECORD'):
+                _cassette = Cassette(os.environ['MACIE_RECORD'], "record")
+                logger.info(f"Recording AWS responses to {_cassette.path}")
+        return(_cassette)
+
+
+def with_cassette(client):
+    """Attach the record/replay cassette to client, if there is one. Returns the client."""
+    cassette = get_cassette()
+    if cassette is not None:
+        cassette.attach(client)
+    return(client)
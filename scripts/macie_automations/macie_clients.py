@@ -0,0 +1,93 @@
+#
+# One place to get AWS clients from.
+#
+# Clients are cached per (service, region) and shared by every thread. boto3 clients are thread safe,
+# but sessions aren't, so they're all made from one session under a lock. That way credentials are only
+# resolved once, and every thread talking to a region reuses that region's pool of keep-alive connections
+# instead of doing its own TLS handshakes.
+#
+# Each client comes with the rate limiter, and the profiler and record/replay cassette when they're on.
+# add_common_args() and start_common() give every script the same --max-workers, region and --profile-api
+# arguments, and turn them on.
+#
+# boto3 takes longer to import than the scripts take to start, so it's only imported when the first client
+# is made. Keep it (and botocore and dateutil) out of module level imports, `macie startup-time` checks.
+#
+
+import threading
+
+from macie_automations.macie_cassette import with_cassette
+from macie_automations.macie_fanout import DEFAULT_MAX_WORKERS
+from macie_automations.macie_profile import with_profiling, start_profiling
+from macie_automations.macie_ratelimit import rate_limited
+
+import logging
+logger = logging.getLogger()
+
+# botocore's standard retry mode backs off with jitter. Give it more attempts than the default 3.
+RETRIES = {'max_attempts': 10, 'mode': 'standard'}
+
+# Connections each client keeps open. botocore's default of 10 is less than the threads that can share
+# a client, which is where the "Connection pool is full" warnings come from.
+DEFAULT_POOL_SIZE = 20
+
+_session = None
+_clients = {}
+_lock = threading.Lock()
+_pool_size = DEFAULT_POOL_SIZE
+
+
+def add_common_args(parser, refresh_regions=True):
+    """Add the arguments every script that calls AWS takes: --max-workers, --all-regions, --refresh-regions
+    (unless the script always refreshes them), --profile-api and --profile-report."""
+    parser.add_argument("--max-workers", help="Number of regions to process at once", type=int, default=DEFAULT_MAX_WORKERS)
+    parser.add_argument("--all-regions", help="Process every region, not just the ones with Macie enabled", action='store_true')
+    if refresh_regions:
+        parser.add_argument("--refresh-regions", help="Ignore the cached list of regions", action='store_true')
+    parser.add_argument("--profile-api", help="Print a summary of the AWS calls made, and where the time went, at exit", action='store_true')
+    parser.add_argument("--profile-report", help="Also save the --profile-api summary to this JSON file")
+
+
+def start_common(args):
+    """Act on the add_common_args() arguments. Call once the arguments are parsed, before any AWS calls."""
+    if args.profile_api or args.profile_report:
+        start_profiling(args.profile_report)
+    configure_clients(args)
+
+
+def configure_clients(args):
+    """Size the connection pools for the concurrency in the standard --max-workers, --batches-in-flight and
+    --member-workers arguments. Call before the first get_client(), clients already made keep their pools."""
+    global _pool_size
+    # Every thread that can be using one region's client at the same time, plus a spare for the region's own thread
+    threads = max([getattr(args, a, None) or 0 for a in ['max_workers', 'batches_in_flight', 'member_workers']])
+    _pool_size = max(DEFAULT_POOL_SIZE, threads + 1)
+    logger.debug(f"Client connection pools hold {_pool_size} connections")
+
+
+def get_session():
+    """The boto3 session every client is made from."""
+    global _session
+    with _lock:
+        if _session is None:
+            import boto3
+            _session = boto3.session.Session()
+        return(_session)
+
+
+def get_client(service, region=None):
+    """Return the shared client for service in region. Safe to call from any thread."""
+    key = (service, region)
+    client = _clients.get(key)
+    if client is not None:
+        return(client)
+
+    session = get_session()
+    with _lock:
+        if key not in _clients:
+            from botocore.config import Config
+            config = Config(retries=RETRIES, max_pool_connections=_pool_size, tcp_keepalive=True)
+            client = session.client(service, region_name=region, config=config)
+            # Profile before the cassette, a replayed call never gets past it
+            _clients[key] = with_cassette(with_profiling(rate_limited(client)))
+        return(_clients[key])
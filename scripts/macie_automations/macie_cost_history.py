@@ -0,0 +1,145 @@
+#
+# A local history of what Macie has cost, kept in SQLite. get_macie_actual_cost.py saves a dated snapshot
+# of the costs each time it runs, and cost_trend.py works out the daily changes and spots spikes from
+# the saved snapshots alone, without calling AWS.
+#
+# Snapshots are by account, region and usage type when they come from --by-account, or just by region and
+# usage type (account ALL_ACCOUNTS) when they're the organization's totals. Running more than once a day
+# replaces that day's snapshot.
+#
+
+import sqlite3
+from datetime import date, datetime, timezone
+from statistics import median
+
+from macie_automations.macie_cache import cache_path, profile_name
+from macie_automations.macie_usage import USAGE_COLUMNS
+
+import logging
+logger = logging.getLogger()
+
+# Account id for the organization wide totals from get_usage_totals
+ALL_ACCOUNTS = "*"
+
+# Earlier days each day's cost is compared with, and how few of them is too few to say anything
+DEFAULT_WINDOW = 14
+MIN_HISTORY = 5
+
+# How many robust standard deviations (from the median absolute deviation) from the median a day has to be
+# to be flagged, and how many dollars a day it has to be out by as well, so pennies aren't flagged.
+DEFAULT_THRESHOLD = 3.5
+DEFAULT_MIN_CHANGE = 1.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS costs (
+    snapshot_date TEXT,
+    time_range TEXT,
+    account_id TEXT,
+    region TEXT,
+    usage_type TEXT,
+    cost REAL,
+    PRIMARY KEY (snapshot_date, time_range, account_id, region, usage_type)
+);
+CREATE INDEX IF NOT EXISTS costs_time_range ON costs (time_range, snapshot_date);
+"""
+
+
+def open_cost_history(path=None):
+    """Open (creating if needed) the cost history database. Defaults to one per AWS profile in the cache dir."""
+    if path is None:
+        path = cache_path(f"cost-history-{profile_name()}.db")
+    db = sqlite3.connect(path)
+    db.executescript(SCHEMA)
+    return(db)
+
+
+def today():
+    # Macie's usage is by UTC day
+    return(datetime.now(timezone.utc).date().isoformat())
+
+
+def record_costs(db, costs, time_range, regions, by_account, snapshot_date=None):
+    """Save costs {(account, region, type): cost} as the snapshot of regions for snapshot_date (default today).
+
+    by_account says whether these are per account costs or the ALL_ACCOUNTS totals. Only that kind of
+    snapshot is replaced, for the regions given."""
+    if snapshot_date is None:
+        snapshot_date = today()
+    account_test = "account_id != ?" if by_account else "account_id = ?"
+    with db:
+        for r in regions:
+            db.execute(f"DELETE FROM costs WHERE snapshot_date = ? AND time_range = ? AND region = ? AND {account_test}",
+                       (snapshot_date, time_range, r, ALL_ACCOUNTS))
+        db.executemany("INSERT OR REPLACE INTO costs VALUES (?, ?, ?, ?, ?, ?)",
+                       [(snapshot_date, time_range, a, r, t, cost) for (a, r, t), cost in costs.items()])
+    logger.debug(f"Saved {len(costs):,} {time_range} costs for {snapshot_date}")
+
+
+def load_cost_history(db, time_range, group_by):
+    """Return ({group key: {date: cost}}, [dates]) for every snapshot of time_range, adding costs up by the
+    USAGE_COLUMNS in group_by (none for one organization wide total).
+
+    Per day and region the per account snapshot is used if there is one, and the totals if not. Grouping
+    by account only uses the per account snapshots."""
+    rows = db.execute("SELECT snapshot_date, account_id, region, usage_type, cost FROM costs WHERE time_range = ?",
+                      (time_range,)).fetchall()
+    by_account = set([(d, r) for d, a, r, t, cost in rows if a != ALL_ACCOUNTS])
+    indexes = [USAGE_COLUMNS.index(c) for c in group_by]
+
+    series = {}
+    dates = set()
+    for d, a, r, t, cost in rows:
+        if a == ALL_ACCOUNTS and ('account' in group_by or (d, r) in by_account):
+            continue
+        key = tuple([(a, r, t)[i] for i in indexes])
+        costs = series.setdefault(key, {})
+        costs[d] = costs.get(d, 0) + cost
+        dates.add(d)
+    return(series, sorted(dates))
+
+
+def cost_trend(costs, dates, time_range, window=DEFAULT_WINDOW, threshold=DEFAULT_THRESHOLD, min_change=DEFAULT_MIN_CHANGE):
+    """Return [(date, cost, change, per_day, anomaly)] for one group's {date: cost}, one for each of dates the
+    group has a snapshot for. A date without one (a --region run, a region that failed) is skipped, not $0.
+
+    change is the difference from the previous snapshot and per_day that spread over the days in between.
+    A MONTH_TO_DATE total starts again each month, so the first snapshot of a month is all new spend.
+    anomaly is "SPIKE" or "DROP" when per_day is out of line with the window of days before it, else None."""
+    output = []
+    history = []
+    previous = None
+    for d in dates:
+        if d not in costs:
+            continue
+        cost = costs[d]
+        change = per_day = anomaly = None
+        day = date.fromisoformat(d)
+        if previous is not None:
+            previous_day, previous_cost = previous
+            days = (day - previous_day).days
+            if time_range == "MONTH_TO_DATE" and (day.year, day.month) != (previous_day.year, previous_day.month):
+                change = cost
+                days = day.day
+            else:
+                change = cost - previous_cost
+            per_day = change / max(days, 1)
+            anomaly = is_anomaly(per_day, history[-window:], threshold, min_change)
+            history.append(per_day)
+        output.append((d, cost, change, per_day, anomaly))
+        previous = (day, cost)
+    return(output)
+
+
+def is_anomaly(value, history, threshold, min_change):
+    if len(history) < MIN_HISTORY:
+        return(None)
+    middle = median(history)
+    spread = 1.4826 * median([abs(h - middle) for h in history])
+    difference = value - middle
+    if abs(difference) < min_change:
+        return(None)
+    if spread > 0 and abs(difference) / spread < threshold:
+        return(None)
+    if difference > 0:
+        return("SPIKE")
+    return("DROP")
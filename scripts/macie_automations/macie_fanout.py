@@ -0,0 +1,92 @@
+#
+# Run a per-region function across many regions at once and merge the results back in region order
+#
+
+import collections
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import logging
+logger = logging.getLogger()
+
+# Macie is in ~17 regions in most accounts. This is enough to have every region in flight at once
+# without hammering any one endpoint
+DEFAULT_MAX_WORKERS = 8
+
+# What came back from one region. Exactly one of result or error is set.
+RegionResult = collections.namedtuple('RegionResult', ['region', 'result', 'error'])
+
+
+def fan_out(func, regions, *args, max_workers=DEFAULT_MAX_WORKERS, **kwargs):
+    """Call func(region, *args, **kwargs) for each region on a bounded thread pool.
+
+    Returns a list of RegionResult in the same order as regions. An exception in one region is logged
+    and stored on that region's RegionResult so it doesn't stop the other regions.
+    """
+    regions = list(regions)
+    if len(regions) == 0:
+        return([])
+
+    results = {}
+    workers = max(1, min(int(max_workers), len(regions)))
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='region')
+    try:
+        futures = {executor.submit(func, r, *args, **kwargs): r for r in regions}
+        for future in as_completed(futures):
+            r = futures[future]
+            try:
+                results[r] = RegionResult(r, future.result(), None)
+            except Exception as e:
+                logger.error(f"Error in {r}: {error_code(e)} - {e}")
+                results[r] = RegionResult(r, None, e)
+    except KeyboardInterrupt:
+        # Don't wait around for the other regions if the user has given up
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown(wait=True)
+    return([results[r] for r in regions])
+
+
+def first_result(func, regions, *args, max_workers=DEFAULT_MAX_WORKERS, **kwargs):
+    """Call func(region, *args, **kwargs) for each region on a bounded thread pool, and return
+    (region, result) for the first region to come back with something other than None.
+
+    Regions that haven't started yet are cancelled, and we don't wait for the ones in flight.
+    Returns (None, None) if no region had a result. Errors are logged and otherwise ignored.
+    """
+    regions = list(regions)
+    if len(regions) == 0:
+        return(None, None)
+
+    workers = max(1, min(int(max_workers), len(regions)))
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='region')
+    try:
+        futures = {executor.submit(func, r, *args, **kwargs): r for r in regions}
+        for future in as_completed(futures):
+            r = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.error(f"Error in {r}: {error_code(e)} - {e}")
+                continue
+            if result is not None:
+                return(r, result)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return(None, None)
+
+
+def error_code(e):
+    """Return the AWS error code of a ClientError, or the exception class name for anything else."""
+    response = getattr(e, 'response', None)
+    if isinstance(response, dict) and 'Error' in response:
+        return(response['Error'].get('Code', type(e).__name__))
+    return(type(e).__name__)
+
+
+def report_errors(results):
+    """Log a one line summary of the regions that failed. Returns the number of failed regions."""
+    failed = [r for r in results if r.error is not None]
+    if len(failed) > 0:
+        summary = ", ".join([f"{r.region} ({error_code(r.error)})" for r in failed])
+        logger.error(f"{len(failed)} of {len(results)} regions failed: {summary}")
+    return(len(failed))
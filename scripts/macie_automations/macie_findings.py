@@ -0,0 +1,329 @@
+#
+# Stream findings out of Macie across regions.
+#
+# Macie makes you list finding ids, then pass them to get_findings() to get anything useful. Done one
+# page at a time that's two round trips per 50 findings. Instead:
+#   - every region lists its finding ids in its own thread and packs them into full get_findings batches
+#   - a shared pool keeps several get_findings batches in flight at once
+#   - the caller reads the batches back region by region, in the order they were listed
+#
+# Or skip the API entirely and read the findings Macie has already exported to the findings bucket
+# (see enable_macie.py), either straight from S3 or from a local copy of it.
+#
+
+import gzip
+import io
+import json
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from macie_automations.macie_clients import get_client
+from macie_automations.macie_fanout import RegionResult, DEFAULT_MAX_WORKERS
+
+import logging
+logger = logging.getLogger()
+
+# Most ids list_findings will return in a page, and get_findings will accept in a call
+LIST_PAGE_SIZE = 50
+GET_BATCH_SIZE = 50
+
+# How many get_findings calls to have running at once, across all regions
+DEFAULT_BATCHES_IN_FLIGHT = 8
+
+# Ref: https://docs.aws.amazon.com/macie/latest/user/findings-types.html
+FINDING_TYPES = ['SensitiveData:S3Object/Credentials', 'SensitiveData:S3Object/CustomIdentifier',
+                 'SensitiveData:S3Object/Financial', 'SensitiveData:S3Object/Multiple',
+                 'SensitiveData:S3Object/Personal']
+
+# The most groups get_finding_statistics() will return. If we get this many back there are probably more.
+GROUP_LIMIT = 5000
+
+# Used to apply a severity floor to exported findings
+SEVERITY_RANK = {'Low': 1, 'Medium': 2, 'High': 3}
+
+# Fields that are datetimes from the API but strings in the exported files
+DATE_FIELDS = ['createdAt', 'updatedAt']
+
+# Marks the end of a region's queue
+_DONE = object()
+
+
+def build_criteria(bucket=None, job_id=None, severity=None, since=None, until=None, updated_since=None):
+    """Return the findingCriteria for classification findings matching these filters.
+
+    severity is a floor: "Medium" matches High and Medium findings. since and until are datetimes.
+    updated_since is in epoch milliseconds, like a watermark."""
+    findingCriteria = {'criterion': {'category': {'eq': ['CLASSIFICATION']}}}
+
+    if bucket:
+        findingCriteria['criterion']['resourcesAffected.s3Bucket.name'] = {'eq': [bucket]}
+
+    if job_id:
+        findingCriteria['criterion']['classificationDetails.jobId'] = {'eq': [job_id]}
+
+    if severity == "High":
+        findingCriteria['criterion']['severity.description'] = {'eq': ["High"]}
+    elif severity == "Medium":
+        findingCriteria['criterion']['severity.description'] = {'eq': ["High", "Medium"]}
+    else:
+        # No need to add a severity filter
+        pass
+
+    if since:
+        findingCriteria['criterion']['createdAt'] = {'gte': int(since.timestamp())*1000}
+        if until:
+            findingCriteria['criterion']['createdAt']['lte'] = int(until.timestamp())*1000
+
+    if updated_since is not None:
+        findingCriteria['criterion']['updatedAt'] = {'gte': updated_since}
+
+    return(findingCriteria)
+
+
+def list_finding_ids(client, findingCriteria, r, sortCriteria=None):
+    """Yield lists of up to GET_BATCH_SIZE finding ids, however many ids each page of list_findings had."""
+    batch = []
+    kwargs = {'findingCriteria': findingCriteria, 'maxResults': LIST_PAGE_SIZE}
+    if sortCriteria:
+        kwargs['sortCriteria'] = sortCriteria
+    while True:
+        list_response = client.list_findings(**kwargs)
+        logger.debug(f"Found {len(list_response['findingIds'])} findings in {r}")
+        for finding_id in list_response['findingIds']:
+            batch.append(finding_id)
+            if len(batch) == GET_BATCH_SIZE:
+                yield(batch)
+                batch = []
+        if 'nextToken' not in list_response:
+            break
+        kwargs['nextToken'] = list_response['nextToken']
+    if len(batch) > 0:
+        yield(batch)
+
+
+def get_findings(client, finding_ids, sortCriteria=None):
+    # get_findings doesn't return the findings in the order of finding_ids, so it needs sorting too
+    kwargs = {'findingIds': finding_ids}
+    if sortCriteria:
+        kwargs['sortCriteria'] = sortCriteria
+    response = client.get_findings(**kwargs)
+    return(response['findings'])
+
+
+def stream_findings(regions, findingCriteria, region_results=None, max_workers=DEFAULT_MAX_WORKERS,
+                    batches_in_flight=DEFAULT_BATCHES_IN_FLIGHT, sortCriteria=None):
+    """Yield (region, findings) for every batch of findings matching findingCriteria, region by region.
+
+    findingCriteria can also be a function that takes the region and returns its criteria. Findings come
+    back in the order given by sortCriteria, within each region.
+
+    If region_results is a list, a RegionResult with the number of findings (or the error) is appended
+    to it for each region. A region that fails stops yielding, and the other regions carry on.
+    """
+    regions = list(regions)
+    if region_results is None:
+        region_results = []
+
+    # Each region can only get this far ahead of the reader. Keeps memory bounded on big exports.
+    queues = {r: queue.Queue(maxsize=batches_in_flight) for r in regions}
+    stop = threading.Event()
+    get_pool = ThreadPoolExecutor(max_workers=batches_in_flight, thread_name_prefix='get_findings')
+    list_pool = ThreadPoolExecutor(max_workers=max(1, min(int(max_workers), len(regions) or 1)),
+                                   thread_name_prefix='region')
+
+    def produce(r):
+        client = get_client('macie2', r)
+        try:
+            criteria = findingCriteria(r) if callable(findingCriteria) else findingCriteria
+            for batch in list_finding_ids(client, criteria, r, sortCriteria):
+                if stop.is_set():
+                    return
+                queues[r].put(get_pool.submit(get_findings, client, batch, sortCriteria))
+        except Exception as e:
+            queues[r].put(e)
+        queues[r].put(_DONE)
+
+    try:
+        for r in regions:
+            list_pool.submit(produce, r)
+
+        for r in regions:
+            count = 0
+            error = None
+            while True:
+                item = queues[r].get()
+                if item is _DONE:
+                    break
+                if error is not None:
+                    # Region already failed. Keep draining so its producer can finish.
+                    continue
+                try:
+                    if isinstance(item, Exception):
+                        raise item
+                    findings = item.result()
+                except Exception as e:
+                    error = e
+                    logger.error(f"Error in {r}: {e}")
+                    continue
+                count += len(findings)
+                yield(r, findings)
+            if error is None:
+                region_results.append(RegionResult(r, count, None))
+            else:
+                region_results.append(RegionResult(r, None, error))
+    finally:
+        # Unblock any producer still waiting on a full queue if the reader stopped early
+        stop.set()
+        for q in queues.values():
+            while not q.empty():
+                q.get_nowait()
+        list_pool.shutdown(wait=False, cancel_futures=True)
+        get_pool.shutdown(wait=False, cancel_futures=True)
+
+
+def get_counts_by_bucket(client, r, criterion, accounts):
+    """Return the countsByGroup for criterion grouped by bucket. If there are too many buckets for one
+    call, split the criterion up by account, and then by finding type, until every piece fits."""
+    response = client.get_finding_statistics(
+        findingCriteria={'criterion': criterion},
+        size=GROUP_LIMIT,
+        groupBy='resourcesAffected.s3Bucket.name'
+    )
+    if len(response['countsByGroup']) < GROUP_LIMIT:
+        return(response['countsByGroup'])
+
+    # Bucket names are unique, so the account shards don't overlap. The finding type shards do, a bucket
+    # comes back once for each type of finding it has, so the groups are merged at the end.
+    output = []
+    if 'accountId' not in criterion:
+        if len(accounts) == 0:
+            accounts.extend(get_accounts(client))
+        logger.debug(f"Too many buckets in {r}, splitting by {len(accounts)} accounts")
+        for account_id in accounts:
+            output.extend(get_counts_by_bucket(client, r, dict(criterion, accountId={'eq': [account_id]}), accounts))
+    elif 'type' not in criterion:
+        logger.debug(f"Too many buckets in {r} for {criterion['accountId']['eq'][0]}, splitting by finding type")
+        for finding_type in FINDING_TYPES:
+            output.extend(get_counts_by_bucket(client, r, dict(criterion, type={'eq': [finding_type]}), accounts))
+    else:
+        logger.warning(f"More than {GROUP_LIMIT} buckets in {r} for {json.dumps(criterion)}. Counts will be incomplete")
+        output = response['countsByGroup']
+
+    counts = {}
+    for group in output:
+        counts[group['groupKey']] = counts.get(group['groupKey'], 0) + group['count']
+    return([{'groupKey': key, 'count': count} for key, count in counts.items()])
+
+
+def get_accounts(client):
+    # The delegated admin and all its members. These are all the accounts that can have findings here.
+    output = [get_client('sts').get_caller_identity()['Account']]
+    paginator = client.get_paginator('list_members')
+    for page in paginator.paginate(PaginationConfig={'PageSize': 25}):
+        for a in page['members']:
+            if a['accountId'] not in output:
+                output.append(a['accountId'])
+    return(output)
+
+
+def finding_matches(f, bucket=None, job_id=None, severity=None, since=None, until=None, updated_since=None):
+    """Apply the same filters as build_criteria() to a finding we already have."""
+    if f.get('category') != 'CLASSIFICATION':
+        return(False)
+    if bucket and f['resourcesAffected']['s3Bucket']['name'] != bucket:
+        return(False)
+    if job_id and f['classificationDetails']['jobId'] != job_id:
+        return(False)
+    if severity in ['High', 'Medium'] and SEVERITY_RANK[f['severity']['description']] < SEVERITY_RANK[severity]:
+        return(False)
+    if since and f['createdAt'].timestamp() < since.timestamp():
+        return(False)
+    if until and f['createdAt'].timestamp() > until.timestamp():
+        return(False)
+    if updated_since is not None and epoch_millis(f['updatedAt']) < updated_since:
+        return(False)
+    return(True)
+
+
+def epoch_millis(dt):
+    return(int(round(dt.timestamp() * 1000)))
+
+
+def list_export_files(source):
+    """Yield (name, file-like object) for each exported findings file in source, in name order.
+
+    source is either s3://bucket/prefix or a local directory with the same layout as the bucket."""
+    if source.startswith("s3://"):
+        bucket, _, prefix = source[5:].partition("/")
+        s3_client = get_client('s3')
+        paginator = s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for o in page.get('Contents', []):
+                if not o['Key'].endswith((".jsonl.gz", ".jsonl")):
+                    continue
+                logger.debug(f"Reading s3://{bucket}/{o['Key']}")
+                body = s3_client.get_object(Bucket=bucket, Key=o['Key'])['Body']
+                yield(o['Key'], body)
+                body.close()
+    else:
+        for dirpath, dirnames, filenames in os.walk(source):
+            # os.walk() order isn't defined, sort so the output is the same every run
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if not filename.endswith((".jsonl.gz", ".jsonl")):
+                    continue
+                path = os.path.join(dirpath, filename)
+                logger.debug(f"Reading {path}")
+                with open(path, 'rb') as f:
+                    yield(path, f)
+
+
+def read_export_file(name, fileobj):
+    """Yield each finding in an exported file, decompressing as we go."""
+    from dateutil.parser import isoparse
+    if name.endswith(".gz"):
+        fileobj = gzip.GzipFile(fileobj=fileobj)
+    for line_number, line in enumerate(io.TextIOWrapper(fileobj, encoding='utf-8'), start=1):
+        if line.strip() == "":
+            continue
+        try:
+            f = json.loads(line)
+        except ValueError as e:
+            logger.warning(f"Skipping bad record at {name}:{line_number}: {e}")
+            continue
+        for field in DATE_FIELDS:
+            if isinstance(f.get(field), str):
+                f[field] = isoparse(f[field])
+        yield(f)
+
+
+def stream_exported_findings(source, regions=None, region_results=None, **filters):
+    """Yield (region, findings) for the exported findings in source that match filters (the same
+    keywords as build_criteria). Only one file is open at a time, and nothing is held between batches.
+
+    If region_results is a list, a RegionResult with the number of findings per region is appended to it.
+    """
+    counts = {}
+    batch = []
+    batch_region = None
+    for name, fileobj in list_export_files(source):
+        for f in read_export_file(name, fileobj):
+            if regions and f['region'] not in regions:
+                continue
+            if not finding_matches(f, **filters):
+                continue
+            if f['region'] != batch_region or len(batch) == GET_BATCH_SIZE:
+                if len(batch) > 0:
+                    yield(batch_region, batch)
+                batch = []
+                batch_region = f['region']
+            batch.append(f)
+            counts[f['region']] = counts.get(f['region'], 0) + 1
+    if len(batch) > 0:
+        yield(batch_region, batch)
+
+    if region_results is not None:
+        for r in sorted(counts):
+            region_results.append(RegionResult(r, counts[r], None))
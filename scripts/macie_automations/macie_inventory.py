@@ -0,0 +1,326 @@
+#
+# A local snapshot of Macie's S3 bucket inventory (describe_buckets) for every region, kept in SQLite.
+#
+# Macie refreshes its bucket metadata about once a day, so there's no point paging through
+# describe_buckets more often than that. A region is only re-read when the newest lastUpdated in its
+# snapshot is older than the TTL. Re-reading a region pages through all of its buckets, since describe_buckets
+# can't say which buckets changed or went away, but only the rows that changed are rewritten in the database.
+#
+# When all that's wanted is the totals for every bucket (or every bucket in some accounts),
+# get_bucket_statistics has Macie add them up instead, in one call per region.
+#
+# Each bucket's size is also kept every time Macie updates it, so we can tell how fast buckets grow, which
+# is what a weekly job that only scans new objects costs.
+#
+
+import json
+import sqlite3
+import time
+from datetime import datetime, timezone
+
+from macie_automations.macie_cache import cache_path, profile_name
+from macie_automations.macie_clients import get_client
+from macie_automations.macie_fanout import fan_out, first_result, DEFAULT_MAX_WORKERS
+
+import logging
+logger = logging.getLogger()
+
+# Macie updates bucket metadata daily
+DEFAULT_TTL = 24 * 60 * 60
+
+# How long to keep each bucket's size history, and how much of it to work growth out from
+HISTORY_TTL = 90 * 24 * 60 * 60
+DEFAULT_GROWTH_DAYS = 30
+
+# The totals from get_bucket_statistics that are added up across accounts
+STATISTICS = ['bucketCount', 'objectCount', 'sizeInBytes', 'classifiableObjectCount', 'classifiableSizeInBytes']
+
+COMPARISONS = {
+    'gt': lambda value, wanted: value > wanted,
+    'gte': lambda value, wanted: value >= wanted,
+    'lt': lambda value, wanted: value < wanted,
+    'lte': lambda value, wanted: value <= wanted,
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    bucket_name TEXT PRIMARY KEY,
+    account_id TEXT,
+    region TEXT,
+    effective_permission TEXT,
+    size_in_bytes INTEGER,
+    object_count INTEGER,
+    classifiable_size_in_bytes INTEGER,
+    classifiable_object_count INTEGER,
+    last_updated REAL,
+    bucket_info TEXT
+);
+CREATE INDEX IF NOT EXISTS buckets_region ON buckets (region);
+CREATE INDEX IF NOT EXISTS buckets_account ON buckets (account_id);
+CREATE INDEX IF NOT EXISTS buckets_permission ON buckets (effective_permission);
+CREATE TABLE IF NOT EXISTS snapshots (
+    region TEXT PRIMARY KEY,
+    snapshot_at REAL,
+    last_updated REAL,
+    bucket_count INTEGER
+);
+CREATE TABLE IF NOT EXISTS bucket_history (
+    bucket_name TEXT,
+    last_updated REAL,
+    classifiable_size_in_bytes INTEGER,
+    classifiable_object_count INTEGER,
+    PRIMARY KEY (bucket_name, last_updated)
+);
+"""
+
+
+def open_inventory(path=None):
+    """Open (creating if needed) the inventory database. Defaults to one per AWS profile in the cache dir."""
+    if path is None:
+        path = cache_path(f"inventory-{profile_name()}.db")
+    db = sqlite3.connect(path)
+    db.row_factory = sqlite3.Row
+    db.executescript(SCHEMA)
+    return(db)
+
+
+def stale_regions(db, regions, ttl=DEFAULT_TTL):
+    """Return the regions that have no snapshot, or whose data Macie will have refreshed since."""
+    output = []
+    snapshots = {row['region']: row for row in db.execute("SELECT * FROM snapshots")}
+    now = time.time()
+    for r in regions:
+        if r not in snapshots:
+            output.append(r)
+            continue
+        snapshot_at = snapshots[r]['snapshot_at']
+        if now - snapshot_at > ttl:
+            output.append(r)
+            continue
+        # Macie should have refreshed the metadata a TTL after the newest lastUpdated we saw. If that's
+        # passed since we last looked, go get it.
+        if snapshots[r]['last_updated'] is not None:
+            next_update = snapshots[r]['last_updated'] + ttl
+            if snapshot_at < next_update <= now:
+                output.append(r)
+    return(output)
+
+
+def refresh_inventory(db, regions, force=False, ttl=DEFAULT_TTL, max_workers=DEFAULT_MAX_WORKERS):
+    """Re-read describe_buckets in full in every region that needs it. Only the database writes are
+    incremental, see save_region(). Returns the fan_out() results."""
+    if not force:
+        regions = stale_regions(db, regions, ttl)
+    if len(regions) == 0:
+        logger.debug("Bucket inventory is up to date")
+        return([])
+    logger.info(f"Refreshing bucket inventory in {', '.join(regions)}")
+
+    region_results = fan_out(describe_all_buckets, regions, max_workers=max_workers)
+    for region_result in region_results:
+        if region_result.error is None:
+            save_region(db, region_result.region, region_result.result)
+    return(region_results)
+
+
+def describe_all_buckets(r):
+    macie_client = get_client('macie2', r)
+    output = []
+    paginator = macie_client.get_paginator('describe_buckets')
+    for page in paginator.paginate():
+        output.extend(page['buckets'])
+    return(output)
+
+
+def save_region(db, r, buckets):
+    """Replace the region's snapshot with buckets, only rewriting the rows that changed."""
+    known = {row['bucket_name']: row['last_updated'] for row in
+             db.execute("SELECT bucket_name, last_updated FROM buckets WHERE region = ?", [r])}
+    rows = []
+    newest = None
+    for b in buckets:
+        last_updated = epoch(b.get('lastUpdated'))
+        if last_updated is not None and (newest is None or last_updated > newest):
+            newest = last_updated
+        if b['bucketName'] in known and known[b['bucketName']] == last_updated:
+            continue
+        rows.append(bucket_row(r, b))
+    gone = set(known) - set([b['bucketName'] for b in buckets])
+
+    with db:
+        db.executemany("INSERT OR REPLACE INTO buckets VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        db.executemany("DELETE FROM buckets WHERE bucket_name = ?", [[b] for b in gone])
+        db.execute("INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?)", [r, time.time(), newest, len(buckets)])
+        save_history(db, buckets)
+    logger.debug(f"{r}: {len(buckets)} buckets, {len(rows)} changed, {len(gone)} removed")
+
+
+def bucket_row(r, b):
+    # The buckets table row for a describe_buckets entry
+    return([
+        b['bucketName'], b['accountId'], r,
+        b.get('publicAccess', {}).get('effectivePermission', "UNKNOWN"),
+        b.get('sizeInBytes', 0), b.get('objectCount', 0),
+        b.get('classifiableSizeInBytes', 0), b.get('classifiableObjectCount', 0),
+        epoch(b.get('lastUpdated')), json.dumps(b, default=str)
+    ])
+
+
+def epoch(value):
+    if value is None:
+        return(None)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return(value.timestamp())
+
+
+def find_bucket(db, bucket_name):
+    """Return (region, bucket_info) for the bucket, or (None, None) if it's not in the snapshot.
+    bucket_info is the describe_buckets entry for it."""
+    row = db.execute("SELECT region, bucket_info FROM buckets WHERE bucket_name = ?", [bucket_name]).fetchone()
+    if row is None:
+        return(None, None)
+    return(row['region'], json.loads(row['bucket_info']))
+
+
+def get_buckets(db, region=None, effective_permission=None, criteria=None):
+    """Return the rows of the buckets table, optionally for one region and/or effective permission, and
+    only the buckets that meet criteria if given (see bucket_matches)."""
+    query = "SELECT * FROM buckets WHERE 1 = 1"
+    params = []
+    if region:
+        query += " AND region = ?"
+        params.append(region)
+    if effective_permission:
+        query += " AND effective_permission = ?"
+        params.append(effective_permission)
+    rows = db.execute(query + " ORDER BY region, bucket_name", params).fetchall()
+    if criteria:
+        rows = [row for row in rows if bucket_matches(json.loads(row['bucket_info']), criteria)]
+    return(rows)
+
+
+def bucket_matches(bucket_info, criteria):
+    """Whether a describe_buckets entry meets criteria, given the way describe_buckets takes them:
+    {"property.path": {"eq": [...], "neq": [...], "gt": n, "gte": n, "lt": n, "lte": n, "prefix": "..."}}.
+
+    Tags are matched as "key:value" strings. Since this runs on the snapshot it takes any property of the
+    bucket, not just the ones describe_buckets can filter on."""
+    for path, conditions in criteria.items():
+        value = bucket_info
+        for part in path.split("."):
+            value = value.get(part) if isinstance(value, dict) else None
+        if path == "tags":
+            value = [f"{t['key']}:{t['value']}" for t in value or []]
+        values = value if isinstance(value, list) else [value]
+        for comparator, wanted in conditions.items():
+            if comparator == "eq" and not any([v in wanted for v in values]):
+                return(False)
+            if comparator == "neq" and any([v in wanted for v in values]):
+                return(False)
+            if comparator == "prefix" and not any([isinstance(v, str) and v.startswith(wanted) for v in values]):
+                return(False)
+            if comparator in COMPARISONS:
+                if value is None or not COMPARISONS[comparator](value, wanted):
+                    return(False)
+    return(True)
+
+
+def get_bucket_statistics(r, account_ids=None):
+    """Macie's own totals (bucketCount, classifiableSizeInBytes, ...) for the buckets in r, added up over
+    account_ids, or for every account. One call per account, however many buckets there are."""
+    macie_client = get_client('macie2', r)
+    totals = dict([(k, 0) for k in STATISTICS])
+    for account_id in account_ids or [None]:
+        if account_id is None:
+            response = macie_client.get_bucket_statistics()
+        else:
+            response = macie_client.get_bucket_statistics(accountId=account_id)
+        for k in STATISTICS:
+            totals[k] += response.get(k, 0)
+    return(totals)
+
+
+def statistics_accounts(criteria):
+    """get_bucket_statistics can only narrow its totals down to an account. Return the accounts criteria
+    asks for ([] for all of them), or None if the criteria need a per bucket look."""
+    if not criteria:
+        return([])
+    if list(criteria) == ['accountId'] and list(criteria['accountId']) == ['eq']:
+        return(criteria['accountId']['eq'])
+    return(None)
+
+
+def lookup_bucket(db, bucket_name, regions, live=False, max_workers=DEFAULT_MAX_WORKERS):
+    """Return (region, bucket_info) for the bucket, or (None, None) if Macie doesn't know it.
+
+    Answers from the snapshot unless live is set or the bucket is newer than the snapshot. Otherwise
+    every region is asked at once and the first to find it wins. What we find is saved for next time."""
+    if not live:
+        region, bucket_info = find_bucket(db, bucket_name)
+        if bucket_info is not None and region in regions:
+            logger.debug(f"Found {bucket_name} in {region} in the inventory")
+            return(region, bucket_info)
+
+    logger.debug(f"Looking for {bucket_name} in regions {regions}")
+    region, bucket_info = first_result(describe_bucket, regions, bucket_name, max_workers=max_workers)
+    if bucket_info is not None:
+        save_bucket(db, region, bucket_info)
+    return(region, bucket_info)
+
+
+def save_bucket(db, r, b):
+    """Add or update one bucket in the snapshot."""
+    with db:
+        db.execute("INSERT OR REPLACE INTO buckets VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", bucket_row(r, b))
+        save_history(db, [b])
+
+
+def save_history(db, buckets):
+    # One row per bucket per lastUpdated, so seeing the same metadata again adds nothing
+    db.executemany("INSERT OR IGNORE INTO bucket_history VALUES (?, ?, ?, ?)",
+                   [(b['bucketName'], epoch(b.get('lastUpdated')), b.get('classifiableSizeInBytes', 0),
+                     b.get('classifiableObjectCount', 0)) for b in buckets if b.get('lastUpdated') is not None])
+    db.execute("DELETE FROM bucket_history WHERE last_updated < ?", [time.time() - HISTORY_TTL])
+
+
+def bucket_growth(db, days=DEFAULT_GROWTH_DAYS):
+    """Return {bucket_name: (bytes a day, days of history)} from the last days of size history.
+
+    Only growth counts. A bucket shrinks when objects are deleted, and a weekly job doesn't scan those. An
+    object overwritten with one the same size doesn't show up at all, so this is a floor on what changes."""
+    rows = db.execute("SELECT bucket_name, last_updated, classifiable_size_in_bytes FROM bucket_history "
+                      "WHERE last_updated >= ? ORDER BY bucket_name, last_updated", [time.time() - days * 24 * 60 * 60])
+    output = {}
+    previous = None
+    for bucket_name, last_updated, size in rows:
+        if previous is None or previous[0] != bucket_name:
+            first = last_updated
+            grown = 0
+        else:
+            grown += max(0, size - previous[2])
+            history_days = (last_updated - first) / (24 * 60 * 60)
+            if history_days > 0:
+                output[bucket_name] = (grown / history_days, history_days)
+        previous = (bucket_name, last_updated, size)
+    return(output)
+
+
+def describe_bucket(r, bucket_name):
+    macie_client = get_client('macie2', r)
+    return(get_bucket_info(bucket_name, macie_client))
+
+
+def get_bucket_info(bucket_name, client):
+    response = client.describe_buckets(criteria={'bucketName': {'eq': [bucket_name]}})
+
+    if 'buckets' in response and len(response['buckets']) == 1:
+        bucket_info = response['buckets'][0]
+    elif 'buckets' in response and len(response['buckets']) > 1:
+        logger.warning(f"Found multiple buckets with name {bucket_name}. That's really odd.")
+        bucket_info = response['buckets'][0]
+    else:
+        return(None)
+    return(bucket_info)
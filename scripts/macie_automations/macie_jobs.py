@@ -0,0 +1,159 @@
+#
+# Build classification job definitions, and the plan files that create_scan_job.py --apply creates
+# jobs from. Also list and describe the jobs that already exist.
+#
+
+import datetime
+import json
+import uuid
+
+from macie_automations.macie_cache import load_json, save_json, profile_name
+from macie_automations.macie_clients import get_client
+from macie_automations.macie_fanout import fan_out, DEFAULT_MAX_WORKERS
+
+import logging
+logger = logging.getLogger()
+
+# criteria for a job that will scan all public buckets
+PUBLIC_CRITERIA = {
+    'bucketCriteria': {
+        "includes": {"and": [{
+            "simpleCriterion": {
+                "comparator": "EQ",
+                "key": "S3_BUCKET_EFFECTIVE_PERMISSION",
+                "values": ["PUBLIC"]
+                }
+            }]
+        }}
+    }
+
+DAY_OF_WEEK = "MONDAY"  # Start your week off right!
+
+# Most buckets a job's bucketDefinitions can list
+MAX_BUCKETS_PER_JOB = 1000
+
+# Most jobs list_classification_jobs will return in a page
+LIST_PAGE_SIZE = 200
+
+# A job in one of these states will never change again, so its details can be cached forever
+FINISHED_STATUSES = ['COMPLETE', 'CANCELLED']
+
+
+def build_job(jobType, name, s3JobDefinition, description, sample):
+    # define the Macie Job definition
+    job = {
+        "description": description,
+        "initialRun": True,
+        "jobType": jobType,
+        "name": name,
+        "s3JobDefinition": s3JobDefinition,
+        "samplingPercentage": sample
+    }
+    if jobType == 'SCHEDULED':
+        # Weekly jobs only scan new objects, a one-time job should have been run first
+        job['initialRun'] = False
+        job['scheduleFrequency'] = {'weeklySchedule': {'dayOfWeek': DAY_OF_WEEK}}
+    return(job)
+
+
+def pack_jobs(by_region, jobType, name, description, sample):
+    """Return the plan entries for the fewest jobs that scan every bucket in
+    by_region = {region: {accountId: [bucket, ...]}}. Each job has a bucketDefinition per account and at
+    most MAX_BUCKETS_PER_JOB buckets."""
+    jobs = []
+    for r in by_region:
+        # Fill each job up to the limit, splitting an account across jobs if we have to
+        chunks = [[]]
+        count = 0
+        for accountId, buckets in sorted(by_region[r].items()):
+            while len(buckets) > 0:
+                if count == MAX_BUCKETS_PER_JOB:
+                    chunks.append([])
+                    count = 0
+                take = buckets[:MAX_BUCKETS_PER_JOB - count]
+                buckets = buckets[len(take):]
+                chunks[-1].append({'accountId': accountId, 'buckets': take})
+                count += len(take)
+        for i, bucketDefinitions in enumerate(chunks, start=1):
+            job_name = f"{name}-{r}" if len(chunks) == 1 else f"{name}-{r}-{i}"
+            job = build_job(jobType, job_name, {'bucketDefinitions': bucketDefinitions}, description, sample)
+            # Applying the same plan twice won't make the jobs twice
+            job['clientToken'] = str(uuid.uuid4())
+            jobs.append({'region': r, 'job': job})
+    return(jobs)
+
+
+def write_plan(filename, jobs, **extra):
+    """Write a plan file. Anything in extra is saved alongside the jobs for the reviewer."""
+    from dateutil import tz
+    plan = {'createdAt': datetime.datetime.now(tz.tzutc()).isoformat(), 'jobs': jobs}
+    plan.update(extra)
+    with open(filename, 'w') as f:
+        json.dump(plan, f, indent=2, default=str)
+
+
+def load_plan(filename):
+    with open(filename) as f:
+        return(json.load(f))
+
+
+def plan_bucket_count(plan_entry):
+    return(sum([len(bd['buckets']) for bd in plan_entry['job']['s3JobDefinition'].get('bucketDefinitions', [])]))
+
+
+def list_jobs(r, filterCriteria=None):
+    """Return every classification job in the region, following nextToken."""
+    macie_client = get_client('macie2', r)
+    kwargs = {}
+    if filterCriteria:
+        kwargs['filterCriteria'] = filterCriteria
+    output = []
+    paginator = macie_client.get_paginator('list_classification_jobs')
+    for page in paginator.paginate(PaginationConfig={'PageSize': LIST_PAGE_SIZE}, **kwargs):
+        output.extend(page['items'])
+    return(output)
+
+
+def describe_jobs(jobs, max_workers=DEFAULT_MAX_WORKERS):
+    """Return {jobId: job_details()} for jobs = {jobId: region}, describing them all at once.
+
+    Finished jobs are cached on disk, so they're only ever described once. Jobs that couldn't be
+    described are left out."""
+    cache_name = f"jobs-{profile_name()}.json"
+    cached = load_json(cache_name) or {}
+    output = {job_id: cached[job_id] for job_id in jobs if job_id in cached}
+    wanted = [job_id for job_id in jobs if job_id not in output]
+    logger.debug(f"{len(output)} jobs in the cache, describing {len(wanted)}")
+    if len(wanted) == 0:
+        return(output)
+
+    finished = 0
+    # fan_out() doesn't care that these are job ids rather than regions
+    for result in fan_out(describe_job, wanted, jobs, max_workers=max_workers):
+        if result.error is not None:
+            continue
+        output[result.region] = result.result
+        if result.result['jobStatus'] in FINISHED_STATUSES:
+            cached[result.region] = result.result
+            finished += 1
+    if finished > 0:
+        save_json(cache_name, cached)
+    return(output)
+
+
+def describe_job(job_id, jobs):
+    response = get_client('macie2', jobs[job_id]).describe_classification_job(jobId=job_id)
+    return(job_details(response))
+
+
+def job_details(response):
+    # The parts of describe_classification_job we report on, in a form that can go in the cache
+    statistics = response.get('statistics', {})
+    last_run_time = response.get('lastRunTime')
+    return({
+        'jobStatus': response['jobStatus'],
+        'approximateNumberOfObjectsToProcess': int(statistics.get('approximateNumberOfObjectsToProcess', 0)),
+        'numberOfRuns': int(statistics.get('numberOfRuns', 0)),
+        'lastRunErrorStatus': response.get('lastRunErrorStatus', {}).get('code', 'NONE'),
+        'lastRunTime': last_run_time.isoformat() if last_run_time else None
+    })
@@ -0,0 +1,21 @@
+#
+# What Macie charges to scan S3 objects. Shared by the scripts that estimate or plan scans.
+#
+
+# https://aws.amazon.com/macie/pricing/
+PRICE_PER_GB = 1
+
+DIVISOR = 1024*1024*1024
+PRICE_PER_BYTE = PRICE_PER_GB / DIVISOR
+
+WEEKS_PER_MONTH = 52 / 12
+
+
+def scan_cost(classifiable_bytes, sample=100):
+    """What a scan of classifiable_bytes will cost, scanning sample percent of the objects."""
+    return(classifiable_bytes * PRICE_PER_BYTE * sample / 100)
+
+
+def weekly_scan_cost(weekly_bytes, sample=100):
+    """What a weekly job costs a month, when it only scans the weekly_bytes of objects added or changed each week."""
+    return(scan_cost(weekly_bytes, sample) * WEEKS_PER_MONTH)
@@ -0,0 +1,225 @@
+#
+# Where does a run spend its time? With --profile-api every AWS call is counted per operation and region:
+# calls, HTTP attempts, retries, throttles, errors, bytes each way, time spent waiting on the rate limiter
+# and a latency histogram. Scripts can also time their own stages (writing the output file, say).
+#
+# A summary is printed to stderr when the script exits, and optionally saved as JSON for tracking
+# trends between runs.
+#
+
+import atexit
+import contextlib
+import json
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import logging
+logger = logging.getLogger()
+
+# Upper bounds of the latency histogram buckets, in milliseconds. The last bucket catches everything else.
+LATENCY_BUCKETS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]
+
+
+class OperationStats(object):
+
+    def __init__(self):
+        self.calls = 0
+        self.attempts = 0
+        self.throttles = 0
+        self.errors = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.latency = 0.0
+        self.rate_limit_wait = 0.0
+        self.histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def add_latency(self, seconds):
+        self.calls += 1
+        self.latency += seconds
+        ms = seconds * 1000
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if ms <= bound:
+                self.histogram[i] += 1
+                return
+        self.histogram[-1] += 1
+
+    def percentile(self, p):
+        """Upper bound of the histogram bucket the p'th percentile falls in, in ms. None past the last bound."""
+        target = p / 100 * self.calls
+        seen = 0
+        for i, count in enumerate(self.histogram):
+            seen += count
+            if count > 0 and seen >= target:
+                return(LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else None)
+        return(None)
+
+    def to_dict(self):
+        return({
+            'calls': self.calls, 'attempts': self.attempts, 'retries': max(0, self.attempts - self.calls),
+            'throttles': self.throttles, 'errors': self.errors, 'bytesSent': self.bytes_sent,
+            'bytesReceived': self.bytes_received, 'latencySeconds': round(self.latency, 3),
+            'rateLimitWaitSeconds': round(self.rate_limit_wait, 3),
+            'latencyHistogram': dict(zip([str(b) for b in LATENCY_BUCKETS] + ['+Inf'], self.histogram))
+        })
+
+
+class ApiProfiler(object):
+
+    def __init__(self):
+        self.operations = {}
+        self.stages = {}
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+
+    def stats(self, service, operation, region):
+        # Caller holds the lock
+        key = (service, operation, region)
+        if key not in self.operations:
+            self.operations[key] = OperationStats()
+        return(self.operations[key])
+
+    def attach(self, client):
+        region = client.meta.region_name
+
+        def names(event_name):
+            # Event names look like before-send.macie2.ListFindings
+            _, service, operation = event_name.split(".")[:3]
+            return(service, operation, region)
+
+        def before_call(context, **kwargs):
+            context['profile_start'] = time.monotonic()
+
+        def after_call(event_name, http_response, context, **kwargs):
+            start = context.get('profile_start')
+            latency = time.monotonic() - start if start is not None else 0
+            with self.lock:
+                s = self.stats(*names(event_name))
+                s.add_latency(latency)
+                if http_response.status_code >= 300:
+                    s.errors += 1
+
+        def before_send(event_name, request, **kwargs):
+            body = request.body
+            with self.lock:
+                s = self.stats(*names(event_name))
+                s.attempts += 1
+                if body:
+                    s.bytes_sent += len(body) if isinstance(body, (bytes, str)) else 0
+
+        def needs_retry(event_name, response=None, **kwargs):
+            if response is None:
+                return(None)
+            with self.lock:
+                # Don't read streaming bodies just to measure them
+                self.stats(*names(event_name)).bytes_received += int(response[0].headers.get('content-length', 0) or 0)
+            return(None)
+
+        client.meta.events.register('before-call', before_call)
+        client.meta.events.register('after-call', after_call)
+        client.meta.events.register('before-send', before_send)
+        client.meta.events.register('needs-retry', needs_retry)
+        return(client)
+
+    def record_wait(self, service, operation, region, seconds):
+        with self.lock:
+            self.stats(service, operation, region).rate_limit_wait += seconds
+
+    def record_throttle(self, service, operation, region):
+        with self.lock:
+            self.stats(service, operation, region).throttles += 1
+
+    def add_stage(self, name, seconds):
+        with self.lock:
+            total, count = self.stages.get(name, (0.0, 0))
+            self.stages[name] = (total + seconds, count + 1)
+
+    def report(self):
+        return({
+            'createdAt': datetime.now(timezone.utc).isoformat(),
+            'command': " ".join(sys.argv),
+            'elapsedSeconds': round(time.monotonic() - self.started, 3),
+            'operations': [dict(service=k[0], operation=k[1], region=k[2], **s.to_dict())
+                           for k, s in sorted(self.operations.items(), key=lambda i: [str(x) for x in i[0]])],
+            'stages': {name: {'seconds': round(total, 3), 'count': count} for name, (total, count) in self.stages.items()}
+        })
+
+    def print_summary(self, file=sys.stderr):
+        print(f"\nAPI profile ({time.monotonic() - self.started:.1f}s elapsed)", file=file)
+        print(f"{'Operation':<40} {'Region':<15} {'Calls':>7} {'Retries':>7} {'Throttles':>9} {'Errors':>6} "
+              f"{'KB out':>8} {'KB in':>9} {'Avg ms':>7} {'p95 ms':>7} {'Wait s':>7}", file=file)
+        # Slowest operations first
+        for (service, operation, region), s in sorted(self.operations.items(), key=lambda i: -i[1].latency):
+            avg = 1000 * s.latency / s.calls if s.calls else 0
+            p95 = s.percentile(95)
+            print(f"{service + ':' + operation:<40} {str(region):<15} {s.calls:>7,} {max(0, s.attempts - s.calls):>7,} "
+                  f"{s.throttles:>9,} {s.errors:>6,} {s.bytes_sent / 1024:>8,.0f} {s.bytes_received / 1024:>9,.0f} "
+                  f"{avg:>7,.0f} {p95 if p95 is not None else '>' + str(LATENCY_BUCKETS[-1]):>7} {s.rate_limit_wait:>7.1f}",
+                  file=file)
+        if len(self.stages) > 0:
+            print(f"\n{'Stage':<40} {'Seconds':>9} {'Count':>9}", file=file)
+            for name, (total, count) in sorted(self.stages.items(), key=lambda i: -i[1][0]):
+                print(f"{name:<40} {total:>9.1f} {count:>9,}", file=file)
+
+
+_profiler = None
+
+
+def start_profiling(report_file=None):
+    """Profile every client made from now on. The summary is printed, and report_file written, at exit."""
+    global _profiler
+    _profiler = ApiProfiler()
+
+    def finish():
+        _profiler.print_summary()
+        if report_file:
+            with open(report_file, 'w') as f:
+                json.dump(_profiler.report(), f, indent=2)
+            logger.info(f"Wrote API profile to {report_file}")
+    atexit.register(finish)
+    return(_profiler)
+
+
+def with_profiling(client):
+    """Attach the profiler to client if profiling is on. Returns the client."""
+    if _profiler is not None:
+        _profiler.attach(client)
+    return(client)
+
+
+# The rate limiter already knows when it waited and when it was throttled, so it tells us
+
+def record_wait(service, operation, region, seconds):
+    if _profiler is not None:
+        _profiler.record_wait(service, operation, region, seconds)
+
+
+def record_throttle(service, operation, region):
+    if _profiler is not None:
+        _profiler.record_throttle(service, operation, region)
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Time a block of code as a stage of the run. Costs next to nothing when profiling is off."""
+    if _profiler is None:
+        yield
+        return
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        _profiler.add_stage(name, time.monotonic() - start)
+
+
+def timed(name, iterable):
+    """Yield from iterable, timing how long each item takes to arrive as the stage name."""
+    iterator = iter(iterable)
+    while True:
+        with stage(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield(item)
@@ -0,0 +1,125 @@
+#
+# Client side rate limiting shared by every thread in a script.
+#
+# Each (service, operation, region) gets a token bucket. Every HTTP attempt, retries included, takes a
+# token from the bucket for the call it belongs to. Successful attempts slowly raise the bucket's rate,
+# and a throttling error halves it (AIMD), so we settle just under what the service will allow instead of
+# sleeping for the worst case. botocore still does the jittered backoff between retries.
+#
+
+import threading
+import time
+
+from macie_automations.macie_profile import record_wait, record_throttle
+
+import logging
+logger = logging.getLogger()
+
+# Starting point for every bucket, in requests per second. Buckets find their own level from here.
+DEFAULT_RATE = 5.0
+MIN_RATE = 0.5
+MAX_RATE = 50.0
+BURST = 5
+
+# AIMD tuning. Each success adds INCREASE req/s, a throttle multiplies the rate by DECREASE.
+INCREASE = 0.1
+DECREASE = 0.5
+
+# A burst of concurrent requests all get throttled together. Only count that as one slow down.
+DECREASE_COOLDOWN = 1.0
+
+# Error codes that mean slow down
+THROTTLE_CODES = ['ThrottlingException', 'Throttling', 'TooManyRequestsException', 'RequestLimitExceeded',
+                  'SlowDown', 'RequestThrottled', 'RequestThrottledException']
+
+
+class TokenBucket(object):
+
+    def __init__(self, name, rate=DEFAULT_RATE, burst=BURST):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last_refill = time.monotonic()
+        self.last_decrease = 0
+        self.throttles = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request is allowed. Returns how long we waited."""
+        waited = 0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+                self.last_refill = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return(waited)
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def succeeded(self):
+        with self.lock:
+            self.rate = min(MAX_RATE, self.rate + INCREASE)
+
+    def throttled(self):
+        with self.lock:
+            self.throttles += 1
+            now = time.monotonic()
+            if now - self.last_decrease < DECREASE_COOLDOWN:
+                return
+            self.last_decrease = now
+            self.rate = max(MIN_RATE, self.rate * DECREASE)
+            # Stop the requests queued behind this one from all going at once
+            self.tokens = min(self.tokens, 0)
+        logger.debug(f"Throttled on {self.name}, slowing to {self.rate:.1f} req/s")
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(service, operation, region):
+    key = (service, operation, region)
+    with _buckets_lock:
+        if key not in _buckets:
+            _buckets[key] = TokenBucket(f"{service}:{operation} in {region}")
+        return(_buckets[key])
+
+
+def rate_limited(client):
+    """Register the rate limiting handlers on a client and return it."""
+    region = client.meta.region_name
+
+    def names(event_name):
+        # Event names look like before-send.macie2.ListFindings
+        _, service, operation = event_name.split(".")[:3]
+        return(service, operation, region)
+
+    def bucket_for(event_name):
+        return(get_bucket(*names(event_name)))
+
+    def before_send(event_name, **kwargs):
+        waited = bucket_for(event_name).acquire()
+        if waited > 0:
+            record_wait(*names(event_name), waited)
+
+    def needs_retry(event_name, response=None, **kwargs):
+        if response is None:
+            # Connection errors and the like aren't a rate problem
+            return(None)
+        error_code = response[1].get('Error', {}).get('Code')
+        if error_code in THROTTLE_CODES:
+            bucket_for(event_name).throttled()
+            record_throttle(*names(event_name))
+        elif error_code is None:
+            bucket_for(event_name).succeeded()
+        # Leave the retry decision to botocore
+        return(None)
+
+    client.meta.events.register('before-send', before_send)
+    client.meta.events.register('needs-retry', needs_retry)
+    return(client)
+
@@ -0,0 +1,101 @@
+#
+# Figure out which regions to run in. The region list (and which of those have Macie enabled) is cached
+# on disk so a warm run makes no discovery calls at all.
+#
+
+from macie_automations.macie_cache import load_json, save_json, profile_name
+from macie_automations.macie_clients import get_client
+from macie_automations.macie_fanout import fan_out, DEFAULT_MAX_WORKERS
+
+import logging
+logger = logging.getLogger()
+
+# Regions don't change much. Re-check once a day
+DEFAULT_TTL = 24 * 60 * 60
+
+# What get_macie_session() raises in a region where Macie isn't enabled. AccessDeniedException is also
+# what an IAM denial looks like, so the message has to say Macie isn't enabled as well.
+MACIE_DISABLED_ERRORS = ['AccessDeniedException', 'ResourceNotFoundException']
+MACIE_DISABLED_MESSAGE = "not enabled"
+
+
+def resolve_regions(args, refresh=False):
+    """Return the regions a script should process, based on the standard --region, --all-regions,
+    --refresh-regions and --max-workers arguments."""
+    if getattr(args, 'region', None):
+        return([args.region])
+    return(get_regions(
+        macie_only=not getattr(args, 'all_regions', False),
+        refresh=refresh or getattr(args, 'refresh_regions', False),
+        max_workers=getattr(args, 'max_workers', DEFAULT_MAX_WORKERS)
+    ))
+
+
+def get_regions(macie_only=True, refresh=False, ttl=DEFAULT_TTL, max_workers=DEFAULT_MAX_WORKERS):
+    """Return an array of the regions this account is active in. Ordered with us-east-1 in the front.
+
+    With macie_only, only the regions where Macie is ENABLED are returned.
+    """
+    cache_name = f"regions-{profile_name()}.json"
+    cached = None if refresh else load_json(cache_name, ttl=ttl)
+    if cached is None:
+        cached = {'regions': describe_regions(), 'macie_regions': None}
+        save_json(cache_name, cached)
+
+    if not macie_only:
+        return(cached['regions'])
+
+    if cached['macie_regions'] is None:
+        macie_regions, complete = probe_macie_regions(cached['regions'], max_workers)
+        if not complete:
+            # Don't remember a partial answer for a whole day
+            return(macie_regions)
+        if len(macie_regions) == 0:
+            # More likely something's wrong than Macie being off everywhere. Don't remember that either
+            logger.warning("Macie isn't enabled in any region")
+            return(macie_regions)
+        cached['macie_regions'] = macie_regions
+        save_json(cache_name, cached)
+
+    logger.debug(f"Macie is enabled in {cached['macie_regions']}")
+    return(cached['macie_regions'])
+
+
+def describe_regions():
+    ec2 = get_client('ec2')
+    response = ec2.describe_regions()
+    output = ['us-east-1']
+    for r in response['Regions']:
+        if r['RegionName'] == "us-east-1":
+            continue
+        output.append(r['RegionName'])
+    return(output)
+
+
+def probe_macie_regions(regions, max_workers=DEFAULT_MAX_WORKERS):
+    """Return the regions where Macie is ENABLED, and whether every region could be checked.
+    Regions we couldn't check are kept, it's better to visit a dead region than miss a live one."""
+    output = []
+    complete = True
+    for region_result in fan_out(get_macie_status, regions, max_workers=max_workers):
+        if region_result.error is not None:
+            complete = False
+            output.append(region_result.region)
+        elif region_result.result == "ENABLED":
+            output.append(region_result.region)
+        else:
+            logger.debug(f"Macie is {region_result.result} in {region_result.region}")
+    return(output, complete)
+
+
+def get_macie_status(r):
+    from botocore.exceptions import ClientError
+    macie_client = get_client('macie2', r)
+    try:
+        response = macie_client.get_macie_session()
+    except ClientError as e:
+        error = e.response['Error']
+        if error['Code'] in MACIE_DISABLED_ERRORS and MACIE_DISABLED_MESSAGE in error.get('Message', "").lower():
+            return("DISABLED")
+        raise
+    return(response['status'])
@@ -0,0 +1,248 @@
+#
+# Output formats for exported findings. Every sink takes findings a batch at a time, so nothing has to
+# hold the whole export in memory.
+#
+#   csv     - the original spreadsheet friendly format, sensitive data flattened into one cell
+#   jsonl   - one JSON object per finding, sensitive data kept as a {category: count} object
+#   parquet - columnar, one count column per sensitive data category. Needs pyarrow.
+#   sqlite  - a findings table with a count column per category, plus a finding_detections child table
+#
+
+import csv
+import json
+import os
+import sqlite3
+
+import logging
+logger = logging.getLogger()
+
+FORMATS = ['csv', 'jsonl', 'parquet', 'sqlite']
+
+CSV_HEADER = ['AccountId', 'BucketName', 'Region', 'FileExtension', 'Severity', 'FindingType',
+              'FindingCount', 'Details', 'ObjectKey', 'S3Path', 'URLPath', 'FindingConsoleURL', 'Finding Creation Date', 'Object-level Public ACL']
+
+# Ref: https://docs.aws.amazon.com/macie/latest/APIReference/findings-describe.html#findings-describe-prop-sensitivedataitem-category
+SENSITIVE_DATA_CATEGORIES = ['CREDENTIALS', 'CUSTOM_IDENTIFIER', 'FINANCIAL_INFORMATION', 'PERSONAL_INFORMATION']
+
+# Columns of the structured formats, in order
+RECORD_FIELDS = ['finding_id', 'account_id', 'bucket_name', 'region', 'object_key', 'file_extension', 'severity',
+                 'finding_type', 'finding_count', 'created_at', 'updated_at', 'job_id', 'object_public_access'] \
+    + [c.lower() for c in SENSITIVE_DATA_CATEGORIES]
+
+# Findings per parquet row group
+DEFAULT_ROW_GROUP_SIZE = 10000
+
+
+def format_for(filename):
+    """Guess the output format from the file extension, defaulting to csv."""
+    extension = os.path.splitext(filename)[1].lstrip(".").lower()
+    if extension in ['db', 'sqlite', 'sqlite3']:
+        return('sqlite')
+    if extension in ['parquet', 'pq']:
+        return('parquet')
+    if extension in ['jsonl', 'ndjson']:
+        return('jsonl')
+    return('csv')
+
+
+def open_sink(fmt, filename, append=False, row_group_size=DEFAULT_ROW_GROUP_SIZE):
+    if fmt == 'csv':
+        return(CSVSink(filename, append))
+    if fmt == 'jsonl':
+        return(JSONLSink(filename, append))
+    if fmt == 'parquet':
+        if append:
+            raise ValueError("Parquet files can't be appended to")
+        return(ParquetSink(filename, row_group_size))
+    if fmt == 'sqlite':
+        return(SQLiteSink(filename, append))
+    raise ValueError(f"Unknown format {fmt}")
+
+
+def finding_to_row(f, r):
+    # Flatten one finding into a row matching CSV_HEADER
+    bucket_name = f['resourcesAffected']['s3Bucket']['name']
+    key = f['resourcesAffected']['s3Object']['key']
+    summary, count = get_summary(f)
+    obj_publicAccess = "Unknown"
+    if 'publicAccess' in f['resourcesAffected']['s3Object']:
+        obj_publicAccess = f['resourcesAffected']['s3Object']['publicAccess']
+    return([f['accountId'], bucket_name, r,
+            f['resourcesAffected']['s3Object']['extension'],
+            f['severity']['description'], f['type'],
+            count, summary, key,
+            f"s3://{bucket_name}/{key}",
+            f"https://{bucket_name}.s3.amazonaws.com/{key}",
+            f"https://{r}.console.aws.amazon.com/macie/home?region={r}#findings?search=resourcesAffected.s3Bucket.name%3D{bucket_name}&macros=current&itemId={f['id']}",
+            f['createdAt'], obj_publicAccess
+            ])
+
+
+def get_summary(finding):
+    summary = []
+    count = 0
+    for data_type in finding['classificationDetails']['result']['sensitiveData']:
+        summary.append(f"{data_type['category']}: {data_type['totalCount']}")
+        count += data_type['totalCount']
+    return("\n".join(summary), count)
+
+
+def category_counts(finding):
+    """Return {category: totalCount} for the finding's sensitive data."""
+    counts = {}
+    for data_type in finding['classificationDetails']['result'].get('sensitiveData', []):
+        counts[data_type['category']] = counts.get(data_type['category'], 0) + data_type['totalCount']
+    return(counts)
+
+
+def finding_to_record(f, r):
+    """Return the finding as a dict of RECORD_FIELDS, with the sensitive data counts as their own columns."""
+    s3_object = f['resourcesAffected']['s3Object']
+    counts = category_counts(f)
+    record = {
+        'finding_id': f['id'],
+        'account_id': f['accountId'],
+        'bucket_name': f['resourcesAffected']['s3Bucket']['name'],
+        'region': r,
+        'object_key': s3_object['key'],
+        'file_extension': s3_object.get('extension'),
+        'severity': f['severity']['description'],
+        'finding_type': f['type'],
+        'finding_count': sum(counts.values()),
+        'created_at': f['createdAt'],
+        'updated_at': f.get('updatedAt'),
+        'job_id': f['classificationDetails'].get('jobId'),
+        'object_public_access': s3_object.get('publicAccess', "Unknown"),
+    }
+    for c in SENSITIVE_DATA_CATEGORIES:
+        record[c.lower()] = counts.get(c, 0)
+    return(record)
+
+
+def json_default(o):
+    # Dates as ISO 8601, anything else as a string
+    if hasattr(o, 'isoformat'):
+        return(o.isoformat())
+    return(str(o))
+
+
+class CSVSink(object):
+
+    def __init__(self, filename, append=False):
+        self.file = open(filename, 'a' if append else 'w', newline='')
+        self.writer = csv.writer(self.file, delimiter=',', quotechar='"', quoting=csv.QUOTE_ALL)
+        if self.file.tell() == 0:
+            self.writer.writerow(CSV_HEADER)
+
+    def write(self, r, findings):
+        self.writer.writerows([finding_to_row(f, r) for f in findings])
+
+    def close(self):
+        self.file.close()
+
+
+class JSONLSink(object):
+
+    def __init__(self, filename, append=False):
+        self.file = open(filename, 'a' if append else 'w')
+
+    def write(self, r, findings):
+        lines = []
+        for f in findings:
+            record = finding_to_record(f, r)
+            # Nest the counts rather than one key per category
+            record['sensitive_data'] = category_counts(f)
+            for c in SENSITIVE_DATA_CATEGORIES:
+                del record[c.lower()]
+            lines.append(json.dumps(record, default=json_default) + "\n")
+        self.file.writelines(lines)
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetSink(object):
+
+    def __init__(self, filename, row_group_size=DEFAULT_ROW_GROUP_SIZE):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise ImportError("pyarrow is needed to write parquet. pip install pyarrow") from e
+        self.pa = pyarrow
+        self.row_group_size = row_group_size
+        self.buffer = []
+        fields = []
+        for name in RECORD_FIELDS:
+            if name in ['created_at', 'updated_at']:
+                fields.append(pyarrow.field(name, pyarrow.timestamp('ms', tz='UTC')))
+            elif name == 'finding_count' or name.upper() in SENSITIVE_DATA_CATEGORIES:
+                fields.append(pyarrow.field(name, pyarrow.int64()))
+            else:
+                fields.append(pyarrow.field(name, pyarrow.string()))
+        self.schema = pyarrow.schema(fields)
+        self.writer = pyarrow.parquet.ParquetWriter(filename, self.schema)
+
+    def write(self, r, findings):
+        self.buffer.extend([finding_to_record(f, r) for f in findings])
+        if len(self.buffer) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if len(self.buffer) == 0:
+            return
+        self.writer.write_table(self.pa.Table.from_pylist(self.buffer, schema=self.schema),
+                                row_group_size=self.row_group_size)
+        self.buffer = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+class SQLiteSink(object):
+
+    def __init__(self, filename, append=False):
+        self.db = sqlite3.connect(filename)
+        if not append:
+            # Start again like the other formats do, rather than keeping rows from earlier runs' filters
+            self.db.executescript("DROP TABLE IF EXISTS findings; DROP TABLE IF EXISTS finding_detections;")
+        columns = []
+        for name in RECORD_FIELDS:
+            if name == 'finding_id':
+                columns.append(f"{name} TEXT PRIMARY KEY")
+            elif name == 'finding_count' or name.upper() in SENSITIVE_DATA_CATEGORIES:
+                columns.append(f"{name} INTEGER")
+            else:
+                columns.append(f"{name} TEXT")
+        self.db.executescript(f"""
+            CREATE TABLE IF NOT EXISTS findings ({", ".join(columns)});
+            CREATE INDEX IF NOT EXISTS findings_bucket ON findings (bucket_name);
+            CREATE INDEX IF NOT EXISTS findings_severity ON findings (severity);
+            CREATE TABLE IF NOT EXISTS finding_detections (
+                finding_id TEXT, category TEXT, type TEXT, count INTEGER);
+            CREATE INDEX IF NOT EXISTS finding_detections_id ON finding_detections (finding_id);
+        """)
+        self.insert = f"INSERT OR REPLACE INTO findings ({', '.join(RECORD_FIELDS)}) " \
+                      f"VALUES ({', '.join(['?'] * len(RECORD_FIELDS))})"
+
+    def write(self, r, findings):
+        rows = []
+        detections = []
+        for f in findings:
+            record = finding_to_record(f, r)
+            for c in ['created_at', 'updated_at']:
+                if record[c] is not None:
+                    record[c] = record[c].isoformat()
+            rows.append([record[c] for c in RECORD_FIELDS])
+            for data_type in f['classificationDetails']['result'].get('sensitiveData', []):
+                for d in data_type.get('detections', []):
+                    detections.append([f['id'], data_type['category'], d['type'], d['count']])
+        with self.db:
+            # A finding that's been updated replaces what we had for it
+            self.db.executemany("DELETE FROM finding_detections WHERE finding_id = ?", [[f['id']] for f in findings])
+            self.db.executemany(self.insert, rows)
+            self.db.executemany("INSERT INTO finding_detections VALUES (?, ?, ?, ?)", detections)
+
+    def close(self):
+        self.db.close()
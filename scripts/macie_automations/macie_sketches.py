@@ -0,0 +1,138 @@
+#
+# Fixed size summaries of a stream of findings: which buckets, key prefixes, file extensions and sensitive
+# data categories show up the most. Memory use depends on the capacity chosen, not on how many findings
+# go through.
+#
+# Space-Saving keeps the top items and an upper bound on how far each count could be off. A count-min
+# sketch of the same stream tightens those counts, since both only ever overestimate.
+#
+
+import heapq
+import random
+from array import array
+
+import logging
+logger = logging.getLogger()
+
+# Items each Space-Saving summary tracks. Comfortably more than anyone reads off the top of a report.
+DEFAULT_CAPACITY = 1000
+
+# Count-min sketch dimensions. Counts are overestimated by at most ~e/width of the total, with
+# probability 1 - e^-depth.
+DEFAULT_WIDTH = 4096
+DEFAULT_DEPTH = 4
+
+
+class SpaceSaving(object):
+    """Top items of a stream in at most capacity counters (Metwally et al)."""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.total = 0
+        # Min-heap of (count, item), one entry per item. Counts only grow, so an entry can be behind its
+        # item's count but never ahead of it. Stale entries are fixed up when they reach the top.
+        self.heap = []
+
+    def add(self, item, count=1):
+        self.total += count
+        if item in self.counts:
+            self.counts[item] += count
+            return
+        if len(self.counts) < self.capacity:
+            self.counts[item] = count
+            self.errors[item] = 0
+            heapq.heappush(self.heap, (count, item))
+            return
+        # Replace the smallest counter. The newcomer could have been seen up to that many times already.
+        while self.counts[self.heap[0][1]] != self.heap[0][0]:
+            victim = self.heap[0][1]
+            heapq.heapreplace(self.heap, (self.counts[victim], victim))
+        smallest, victim = self.heap[0]
+        del self.counts[victim]
+        del self.errors[victim]
+        self.counts[item] = smallest + count
+        self.errors[item] = smallest
+        heapq.heapreplace(self.heap, (smallest + count, item))
+
+    def top(self, n):
+        """Return [(item, count, error)] for the n biggest counts. count - error is a lower bound."""
+        items = heapq.nlargest(n, self.counts.items(), key=lambda i: i[1])
+        return([(item, count, self.errors[item]) for item, count in items])
+
+
+class CountMinSketch(object):
+    """Approximate counts for any item in width x depth counters (Cormode & Muthukrishnan)."""
+
+    def __init__(self, width=DEFAULT_WIDTH, depth=DEFAULT_DEPTH):
+        self.width = width
+        self.depth = depth
+        self.salt = random.getrandbits(32)
+        self.rows = [array('Q', [0]) * width for _ in range(depth)]
+
+    def columns(self, item):
+        # One hash per item, split in two and combined for each row (Kirsch & Mitzenmacher)
+        h = hash((self.salt, item))
+        h1 = h & 0xffffffff
+        h2 = (h >> 32) | 1
+        return([(h1 + i * h2) % self.width for i in range(self.depth)])
+
+    def add(self, item, count=1):
+        for row, column in zip(self.rows, self.columns(item)):
+            row[column] += count
+
+    def estimate(self, item):
+        return(min([row[column] for row, column in zip(self.rows, self.columns(item))]))
+
+
+class HeavyHitters(object):
+    """Space-Saving and count-min together. top() reports the tighter of the two estimates."""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, width=DEFAULT_WIDTH, depth=DEFAULT_DEPTH):
+        self.summary = SpaceSaving(capacity)
+        self.sketch = CountMinSketch(width, depth)
+
+    def add(self, item, count=1):
+        self.summary.add(item, count)
+        self.sketch.add(item, count)
+
+    def top(self, n):
+        output = []
+        for item, count, error in self.summary.top(n):
+            estimate = min(count, self.sketch.estimate(item))
+            output.append((item, estimate, max(0, estimate - (count - error))))
+        output.sort(key=lambda i: -i[1])
+        return(output)
+
+    @property
+    def total(self):
+        return(self.summary.total)
+
+
+class FindingsProfile(object):
+    """Heavy hitters for each dimension of a findings stream. Feed it findings with add()."""
+
+    DIMENSIONS = ['bucket', 'prefix', 'extension', 'category']
+
+    def __init__(self, prefix_depth=1, capacity=DEFAULT_CAPACITY, width=DEFAULT_WIDTH, depth=DEFAULT_DEPTH):
+        self.prefix_depth = prefix_depth
+        self.findings = 0
+        self.dimensions = {d: HeavyHitters(capacity, width, depth) for d in self.DIMENSIONS}
+
+    def add(self, f):
+        self.findings += 1
+        bucket = f['resourcesAffected']['s3Bucket']['name']
+        s3_object = f['resourcesAffected']['s3Object']
+        self.dimensions['bucket'].add(bucket)
+        self.dimensions['prefix'].add(key_prefix(bucket, s3_object['key'], self.prefix_depth))
+        self.dimensions['extension'].add(s3_object.get('extension') or "(none)")
+        # Categories are weighted by how many times they were detected, not the number of findings
+        for data_type in f['classificationDetails']['result'].get('sensitiveData', []):
+            self.dimensions['category'].add(data_type['category'], data_type['totalCount'])
+
+
+def key_prefix(bucket, key, depth):
+    """bucket/ plus the first depth folders of key."""
+    folders = key.split("/")[:-1][:depth]
+    return("/".join([bucket] + folders) + "/")
@@ -0,0 +1,216 @@
+#
+# A compact, columnar, in-memory copy of a set of findings, for asking lots of questions of the same
+# findings without going back to Macie.
+#
+# Each field is one array. Strings (accounts, buckets, regions, ...) are interned and stored as integer
+# codes, severities as 1-3, dates as epoch seconds, and each sensitive data category gets its own count
+# column. A million findings take tens of MB instead of the GBs the boto3 dicts would. Object keys and
+# finding ids aren't kept.
+#
+# Filters return row numbers, and can be chained by passing them back in as rows.
+#
+# A saved store is one line of JSON (the version, string tables and column layout) followed by each
+# column's raw array bytes. Nothing in the file is ever executed, so it's safe to --load one from anyone.
+#
+
+import json
+import sys
+from array import array
+from collections import Counter
+from datetime import datetime
+
+from macie_automations.macie_findings import SEVERITY_RANK
+from macie_automations.macie_sinks import SENSITIVE_DATA_CATEGORIES, category_counts
+
+import logging
+logger = logging.getLogger()
+
+# Bump if the layout of a saved store changes
+STORE_VERSION = 2
+
+STRING_COLUMNS = ['account_id', 'bucket_name', 'region', 'finding_type', 'file_extension', 'job_id']
+CATEGORY_COLUMNS = [c.lower() for c in SENSITIVE_DATA_CATEGORIES]
+
+# array typecodes for everything that isn't an interned string
+NUMBER_COLUMNS = dict([('severity', 'B'), ('created_at', 'd'), ('updated_at', 'd'), ('finding_count', 'I')]
+                      + [(c, 'I') for c in CATEGORY_COLUMNS])
+
+# Columns that make sense to add up
+COUNT_COLUMNS = ['finding_count'] + CATEGORY_COLUMNS
+
+SEVERITIES = {rank: name for name, rank in SEVERITY_RANK.items()}
+
+
+class FindingsStore(object):
+
+    def __init__(self):
+        self.strings = {c: [] for c in STRING_COLUMNS}
+        self.codes = {c: {} for c in STRING_COLUMNS}
+        self.columns = {c: array('I') for c in STRING_COLUMNS}
+        self.columns.update({c: array(t) for c, t in NUMBER_COLUMNS.items()})
+
+    def __len__(self):
+        return(len(self.columns['severity']))
+
+    def intern(self, column, value):
+        codes = self.codes[column]
+        if value not in codes:
+            codes[value] = len(self.strings[column])
+            self.strings[column].append(value)
+        return(codes[value])
+
+    def add(self, f, r):
+        s3_object = f['resourcesAffected']['s3Object']
+        counts = category_counts(f)
+        strings = {
+            'account_id': f['accountId'],
+            'bucket_name': f['resourcesAffected']['s3Bucket']['name'],
+            'region': r,
+            'finding_type': f['type'],
+            'file_extension': s3_object.get('extension'),
+            'job_id': f['classificationDetails'].get('jobId')
+        }
+        for column, value in strings.items():
+            self.columns[column].append(self.intern(column, value))
+        self.columns['severity'].append(SEVERITY_RANK[f['severity']['description']])
+        self.columns['created_at'].append(f['createdAt'].timestamp())
+        self.columns['updated_at'].append(f['updatedAt'].timestamp() if f.get('updatedAt') else 0)
+        self.columns['finding_count'].append(sum(counts.values()))
+        for category, column in zip(SENSITIVE_DATA_CATEGORIES, CATEGORY_COLUMNS):
+            self.columns[column].append(counts.get(category, 0))
+
+    def load_stream(self, findings):
+        """Add every finding from a stream of (region, findings) batches, like stream_findings() returns."""
+        for r, batch in findings:
+            for f in batch:
+                self.add(f, r)
+        return(self)
+
+    def select(self, rows=None, severity=None, bucket_name=None, account_id=None, region=None, finding_type=None,
+               file_extension=None, job_id=None, created_after=None, created_before=None):
+        """Return the row numbers that match every filter given, out of rows (default all of them).
+
+        severity is a floor ("Medium" matches Medium and High). The string filters each take a set of
+        values. created_after and created_before are datetimes or epoch seconds."""
+        strings = {'bucket_name': bucket_name, 'account_id': account_id, 'region': region,
+                   'finding_type': finding_type, 'file_extension': file_extension, 'job_id': job_id}
+        for column, values in strings.items():
+            if values is None:
+                continue
+            codes = set([self.codes[column][v] for v in values if v in self.codes[column]])
+            rows = self.where(column, lambda c: c in codes, rows)
+        if severity is not None:
+            floor = SEVERITY_RANK[severity]
+            rows = self.where('severity', lambda s: s >= floor, rows)
+        if created_after is not None:
+            after = epoch(created_after)
+            rows = self.where('created_at', lambda t: t >= after, rows)
+        if created_before is not None:
+            before = epoch(created_before)
+            rows = self.where('created_at', lambda t: t < before, rows)
+        if rows is None:
+            rows = array('I', range(len(self)))
+        return(rows)
+
+    def where(self, column, test, rows=None):
+        """Return the rows whose value in column passes test."""
+        values = self.columns[column]
+        if rows is None:
+            return(array('I', [i for i, v in enumerate(values) if test(v)]))
+        return(array('I', [i for i in rows if test(values[i])]))
+
+    def group_by(self, columns, rows=None, value=None):
+        """Return [(key, total)] biggest first, grouping rows by one column or a list of columns.
+
+        The total is the number of rows, or the sum of the value column. Keys are decoded back to strings
+        (severities to their names)."""
+        if isinstance(columns, str):
+            columns = [columns]
+        if len(columns) == 1:
+            keys = self.columns[columns[0]]
+        else:
+            keys = list(zip(*[self.columns[c] for c in columns]))
+
+        if value is None and rows is None:
+            totals = Counter(keys)
+        elif value is None:
+            totals = Counter([keys[i] for i in rows])
+        else:
+            totals = Counter()
+            values = self.columns[value]
+            for i in (range(len(self)) if rows is None else rows):
+                totals[keys[i]] += values[i]
+
+        output = []
+        for key, total in totals.most_common():
+            if len(columns) == 1:
+                key = self.decode(columns[0], key)
+            else:
+                key = tuple([self.decode(c, k) for c, k in zip(columns, key)])
+            output.append((key, total))
+        return(output)
+
+    def decode(self, column, value):
+        if column in self.strings:
+            return(self.strings[column][value])
+        if column == 'severity':
+            return(SEVERITIES[value])
+        return(value)
+
+    def column(self, column, rows=None):
+        """Return the decoded values of column, for rows or every row."""
+        values = self.columns[column]
+        if rows is not None:
+            values = [values[i] for i in rows]
+        return([self.decode(column, v) for v in values])
+
+    def save(self, path):
+        header = {
+            'version': STORE_VERSION,
+            'byteorder': sys.byteorder,
+            'strings': self.strings,
+            'columns': [[c, a.typecode, len(a) * a.itemsize] for c, a in self.columns.items()]
+        }
+        with open(path, 'wb') as f:
+            f.write(json.dumps(header).encode() + b"\n")
+            for a in self.columns.values():
+                f.write(a.tobytes())
+
+    @classmethod
+    def load(cls, path):
+        """Load a store written by save(). Raises ValueError if the file isn't one."""
+        store = cls()
+        with open(path, 'rb') as f:
+            try:
+                header = json.loads(f.readline())
+            except ValueError:
+                raise ValueError(f"{path} isn't a saved findings store") from None
+            if not isinstance(header, dict) or header.get('version') != STORE_VERSION:
+                version = header.get('version') if isinstance(header, dict) else None
+                raise ValueError(f"{path} is a version {version} store, expected version {STORE_VERSION}")
+            for c in STRING_COLUMNS:
+                values = header['strings'].get(c)
+                if not isinstance(values, list) or not all([v is None or isinstance(v, str) for v in values]):
+                    raise ValueError(f"{path} has no usable strings for {c}")
+                store.strings[c] = values
+            for c, typecode, size in header['columns']:
+                if c not in store.columns or typecode != store.columns[c].typecode:
+                    raise ValueError(f"{path} has an unexpected column {c} ({typecode})")
+                store.columns[c].frombytes(f.read(size))
+                if len(store.columns[c]) * store.columns[c].itemsize != size:
+                    raise ValueError(f"{path} is truncated in column {c}")
+                if header['byteorder'] != sys.byteorder:
+                    store.columns[c].byteswap()
+        if len(set([len(a) for a in store.columns.values()])) != 1:
+            raise ValueError(f"{path} has columns of different lengths")
+        for c in STRING_COLUMNS:
+            if len(store.columns[c]) > 0 and max(store.columns[c]) >= len(store.strings[c]):
+                raise ValueError(f"{path} has {c} codes with no string")
+        store.codes = {c: {v: i for i, v in enumerate(values)} for c, values in store.strings.items()}
+        return(store)
+
+
+def epoch(value):
+    if isinstance(value, datetime):
+        return(value.timestamp())
+    return(value)
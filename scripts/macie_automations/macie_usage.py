@@ -0,0 +1,62 @@
+#
+# What Macie has actually cost. get_usage_totals gives the whole organization's cost in a region,
+# get_usage_statistics breaks it down by member account.
+#
+
+from collections import Counter
+
+from macie_automations.macie_clients import get_client
+
+import logging
+logger = logging.getLogger()
+
+# Records to ask get_usage_statistics for in each page. There's one record per account, so an
+# organization with thousands of accounts is still only a few pages per region.
+USAGE_PAGE_SIZE = 1000
+
+# What account costs can be added up by
+USAGE_COLUMNS = ['account', 'region', 'type']
+
+
+def get_usage_totals(r, timerange):
+    macie_client = get_client('macie2', r)
+    response = macie_client.get_usage_totals(timeRange=timerange)
+    return(response['usageTotals'])
+
+
+def get_account_costs(r, timerange):
+    """Return a Counter of {(account id, usage type): estimated cost} for every account in r.
+
+    Each page is added up as it arrives, so only the totals are kept however many accounts there are."""
+    macie_client = get_client('macie2', r)
+    paginator = macie_client.get_paginator('get_usage_statistics')
+    costs = Counter()
+    for page in paginator.paginate(timeRange=timerange, PaginationConfig={'PageSize': USAGE_PAGE_SIZE}):
+        for record in page['records']:
+            for usage in record.get('usage', []):
+                cost = float(usage.get('estimatedCost') or 0)
+                if cost != 0:
+                    costs[(record['accountId'], usage['type'])] += cost
+    return(costs)
+
+
+def merge_account_costs(region_results):
+    """Combine the fan_out() results of get_account_costs into {(account, region, type): cost}.
+    Regions that failed are left out."""
+    costs = {}
+    for region_result in region_results:
+        if region_result.error is not None:
+            continue
+        for (account_id, usage_type), cost in region_result.result.items():
+            costs[(account_id, region_result.region, usage_type)] = cost
+    return(costs)
+
+
+def roll_up(costs, group_by):
+    """Return [(key, cost)] most expensive first, adding up costs by the USAGE_COLUMNS in group_by.
+    Keys are tuples of the group_by values."""
+    indexes = [USAGE_COLUMNS.index(c) for c in group_by]
+    totals = Counter()
+    for key, cost in costs.items():
+        totals[tuple([key[i] for i in indexes])] += cost
+    return(totals.most_common())
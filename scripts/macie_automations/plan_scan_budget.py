@@ -0,0 +1,252 @@
+#
+# Work out which buckets to scan, and at what sampling percentage, to get the most out of a scan budget.
+#
+# Every bucket gets a priority from whether it's public, how many findings it already has and how big it
+# is. Scanning p% of a bucket costs p% of the full scan, but we assume sampling finds sensitive data with
+# diminishing returns, so it's worth (p/100)^SAMPLING_RETURN of the bucket's priority. The plan is then a
+# knapsack: spend the budget on whichever bucket upgrade (not scanned -> 10% -> 25% -> ... -> 100%) buys the
+# most priority per dollar.
+#
+# The upgrades are sorted once per sampling ladder and their costs summed, so each what-if budget is
+# answered with a binary search rather than by re-planning.
+#
+
+import math
+import sys
+import time
+from bisect import bisect_right
+from itertools import accumulate
+
+from macie_automations.macie_clients import get_client, add_common_args, start_common
+from macie_automations.macie_fanout import fan_out, report_errors
+from macie_automations.macie_findings import get_counts_by_bucket, SEVERITY_RANK
+from macie_automations.macie_inventory import open_inventory, refresh_inventory, get_buckets
+from macie_automations.macie_jobs import pack_jobs, write_plan
+from macie_automations.macie_pricing import DIVISOR, scan_cost
+from macie_automations.macie_regions import resolve_regions
+
+import logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+logging.getLogger('botocore').setLevel(logging.WARNING)
+logging.getLogger('boto3').setLevel(logging.WARNING)
+logging.getLogger('urllib3').setLevel(logging.WARNING)
+
+# How much a p% sample is worth compared to a full scan is (p/100)^SAMPLING_RETURN
+SAMPLING_RETURN = 0.5
+
+DEFAULT_SAMPLING = "10,25,50,100"
+
+
+def main(args, logger):
+
+    sampling = args.sampling
+    budgets = [args.budget]
+    if args.what_if:
+        budgets += parse_levels(args.what_if, type=float)
+
+    regions = resolve_regions(args)
+    db = open_inventory()
+    region_results = refresh_inventory(db, regions, force=args.refresh, max_workers=args.max_workers)
+    buckets = [b for b in get_buckets(db) if b['region'] in regions and b['classifiable_size_in_bytes'] > 0]
+    if len(buckets) == 0:
+        logger.error(f"No buckets with anything to scan in {regions}")
+        exit(1)
+
+    findings = {}
+    if args.findings_weight > 0:
+        findings = get_findings_by_bucket(regions, args.max_workers, region_results)
+
+    # One list per column, in inventory order
+    sizes = [b['classifiable_size_in_bytes'] for b in buckets]
+    priorities = [bucket_priority(b, findings.get(b['bucket_name'], 0), args) for b in buckets]
+
+    # Every ladder from the lowest level up to each cap, so "what if we never sampled more than 25%" is a scenario too
+    start = time.perf_counter()
+    ladders = {cap: build_ladder(sizes, priorities, [p for p in sampling if p <= cap]) for cap in sampling}
+    scenarios = []
+    for budget in budgets:
+        for cap, ladder in ladders.items():
+            scenarios.append(dict(evaluate(ladder, budget), budget=budget, cap=cap))
+    logger.debug(f"Evaluated {len(scenarios)} scenarios over {len(buckets)} buckets in {time.perf_counter() - start:.3f}s")
+
+    total_priority = sum(priorities)
+    print(f"{'Budget':>12} {'Max Sample':>10} {'Buckets':>8} {'Cost':>12} {'Value':>7}")
+    for s in scenarios:
+        print(f"{'$' + format(s['budget'], ',.0f'):>12} {str(s['cap']) + '%':>10} {s['buckets']:>8,} "
+              f"{'$' + format(s['cost'], ',.2f'):>12} {100 * s['value'] / total_priority:>6.1f}%")
+
+    # The plan is whichever ladder does best with the real budget
+    best = max([s for s in scenarios if s['budget'] == args.budget], key=lambda s: s['value'])
+    levels = assign_levels(ladders[best['cap']], best['steps'], len(buckets))
+    print(f"\nBest plan for ${args.budget:,.0f} samples up to {best['cap']}%:")
+    by_level = {}
+    for i, level in enumerate(levels):
+        if level is not None:
+            by_level.setdefault(level, []).append(i)
+    for level in sorted(by_level, reverse=True):
+        size = sum([sizes[i] for i in by_level[level]])
+        print(f"  {len(by_level[level]):,} buckets at {level}%: {int(size/DIVISOR):,} GB for ${scan_cost(size, level):,.2f}")
+    print(f"  {levels.count(None):,} buckets not scanned")
+
+    if args.plan_file:
+        jobs = []
+        for level in sorted(by_level, reverse=True):
+            by_region = {}
+            for i in by_level[level]:
+                b = buckets[i]
+                by_region.setdefault(b['region'], {}).setdefault(b['account_id'], []).append(b['bucket_name'])
+            jobs += pack_jobs(by_region, 'ONE_TIME', f"{args.name}-{level}pct", args.description, level)
+        write_plan(args.plan_file, jobs, budget=args.budget, estimatedCost=best['cost'], unresolved=[])
+        print(f"Wrote {len(jobs)} jobs to {args.plan_file}. Create them with create_scan_job.py --apply {args.plan_file}")
+    report_errors(region_results)
+
+
+def parse_levels(value, type=int):
+    return(sorted(set([type(v) for v in value.split(",") if v.strip()])))
+
+
+def bucket_priority(b, findings, args):
+    # Everything is worth something. Public buckets, buckets with findings and big buckets are worth more.
+    priority = 1.0
+    if b['effective_permission'] == "PUBLIC":
+        priority += args.public_weight
+    priority += args.findings_weight * math.log1p(findings)
+    priority += args.size_weight * math.log1p(b['classifiable_size_in_bytes'] / DIVISOR)
+    return(priority)
+
+
+def get_findings_by_bucket(regions, max_workers, region_results):
+    """Return {bucket: findings} across regions, with each finding weighted by its severity."""
+    output = {}
+    for region_result in fan_out(get_region_findings, regions, max_workers=max_workers):
+        region_results.append(region_result)
+        if region_result.error is None:
+            output.update(region_result.result)
+    return(output)
+
+
+def get_region_findings(r):
+    macie_client = get_client('macie2', r)
+    accounts = []
+    output = {}
+    for severity, rank in SEVERITY_RANK.items():
+        criterion = {'category': {'eq': ['CLASSIFICATION']}, 'severity.description': {'eq': [severity]}}
+        for group in get_counts_by_bucket(macie_client, r, criterion, accounts):
+            output[group['groupKey']] = output.get(group['groupKey'], 0) + rank * group['count']
+    return(output)
+
+
+def build_ladder(sizes, priorities, levels):
+    """Return every bucket's upgrades through levels as columns sorted best value per dollar first, with
+    the running totals evaluate() searches."""
+    bucket = []
+    level = []
+    cost = []
+    value = []
+    density = []
+    first = []
+    for i, size in enumerate(sizes):
+        previous_cost = 0
+        previous_value = 0
+        for p in levels:
+            step_cost = scan_cost(size, p) - previous_cost
+            if step_cost <= 0:
+                # Nothing to pay for (an empty bucket), so no upgrade to buy. Its value goes to the next step.
+                continue
+            step_value = priorities[i] * (p / 100) ** SAMPLING_RETURN - previous_value
+            bucket.append(i)
+            level.append(p)
+            cost.append(step_cost)
+            value.append(step_value)
+            density.append(step_value / step_cost)
+            first.append(previous_cost == 0)
+            previous_cost += step_cost
+            previous_value += step_value
+
+    # Each bucket's upgrades get less dense as they go, so a prefix of this order never skips a step.
+    # Ties go to the lower level for the same reason.
+    order = sorted(range(len(bucket)), key=lambda j: (-density[j], level[j]))
+    return({
+        'bucket': [bucket[j] for j in order],
+        'level': [level[j] for j in order],
+        'cost': list(accumulate([cost[j] for j in order])),
+        'value': list(accumulate([value[j] for j in order])),
+        'buckets': list(accumulate([1 if first[j] else 0 for j in order]))
+    })
+
+
+def evaluate(ladder, budget):
+    # Take every upgrade we can afford, in order
+    steps = bisect_right(ladder['cost'], budget)
+    if steps == 0:
+        return({'steps': 0, 'buckets': 0, 'cost': 0, 'value': 0})
+    return({'steps': steps, 'buckets': ladder['buckets'][steps - 1], 'cost': ladder['cost'][steps - 1],
+            'value': ladder['value'][steps - 1]})
+
+
+def assign_levels(ladder, steps, count):
+    """Return the sampling percentage for every bucket after the first steps upgrades, None if not scanned."""
+    levels = [None] * count
+    for j in range(steps):
+        levels[ladder['bucket'][j]] = ladder['level'][j]
+    return(levels)
+
+
+def do_args():
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--debug", help="print debugging info", action='store_true')
+    parser.add_argument("--error", help="print error info only", action='store_true')
+    parser.add_argument("--region", help="Only plan for buckets in this region")
+    parser.add_argument("--budget", help="How many dollars to spend on scanning", type=float, required=True)
+    parser.add_argument("--what-if", help="Comma separated list of other budgets to compare")
+    parser.add_argument("--sampling", help="Comma separated sampling percentages to choose from", default=DEFAULT_SAMPLING)
+    parser.add_argument("--public-weight", help="Priority added for a public bucket", type=float, default=10)
+    parser.add_argument("--findings-weight", help="Priority added per log of severity weighted findings. 0 skips looking up findings", type=float, default=2)
+    parser.add_argument("--size-weight", help="Priority added per log of GB of classifiable data", type=float, default=0.5)
+    parser.add_argument("--plan-file", help="Write the best plan's jobs here for create_scan_job.py --apply")
+    parser.add_argument("--name", help="Prefix for the job names", default="budget-scan")
+    parser.add_argument("--description", help="Description to apply to each job", default=f"Created by {sys.argv[0]}")
+    parser.add_argument("--refresh", help="Refresh the bucket inventory from Macie before planning", action='store_true')
+    add_common_args(parser)
+    args = parser.parse_args()
+    return(args)
+
+
+if __name__ == '__main__':
+
+    args = do_args()
+
+    try:
+        args.sampling = parse_levels(args.sampling)
+    except ValueError:
+        args.sampling = []
+    if len(args.sampling) == 0 or args.sampling[0] < 1 or args.sampling[-1] > 100:
+        print(f"--sampling has to be whole percentages from 1 to 100, like {DEFAULT_SAMPLING}")
+        exit(1)
+
+    # Logging idea stolen from: https://docs.python.org/3/howto/logging.html#configuring-logging
+    # create console handler and set level to debug
+    ch = logging.StreamHandler()
+    if args.error:
+        logger.setLevel(logging.ERROR)
+    elif args.debug:
+        logger.setLevel(logging.DEBUG)
+    else:
+        logger.setLevel(logging.INFO)
+
+    # create formatter
+    # formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    formatter = logging.Formatter('%(name)s - %(levelname)s - %(message)s')
+    # add formatter to ch
+    ch.setFormatter(formatter)
+    # add ch to logger
+    logger.addHandler(ch)
+
+    start_common(args)
+
+    try:
+        main(args, logger)
+    except KeyboardInterrupt:
+        exit(1)
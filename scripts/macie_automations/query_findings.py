@@ -0,0 +1,171 @@
+#
+# Load findings into a compact in-memory store once, then slice them as many ways as you like.
+#
+# Fetch from Macie (or the exported findings) and --save the store, then --load it again to ask another
+# question without going back to Macie. --interactive drops into a Python prompt with the store loaded.
+#
+
+import time
+from datetime import datetime
+
+from macie_automations.macie_clients import add_common_args, start_common
+from macie_automations.macie_fanout import report_errors
+from macie_automations.macie_findings import build_criteria, stream_findings, stream_exported_findings, DEFAULT_BATCHES_IN_FLIGHT
+from macie_automations.macie_profile import stage
+from macie_automations.macie_regions import resolve_regions
+from macie_automations.macie_store import FindingsStore, STRING_COLUMNS, COUNT_COLUMNS
+
+import logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+logging.getLogger('botocore').setLevel(logging.WARNING)
+logging.getLogger('boto3').setLevel(logging.WARNING)
+logging.getLogger('urllib3').setLevel(logging.WARNING)
+
+
+def main(args, logger):
+
+    if args.load:
+        with stage("load store"):
+            try:
+                store = FindingsStore.load(args.load)
+            except ValueError as e:
+                logger.error(e)
+                exit(1)
+        logger.info(f"Loaded {len(store):,} findings from {args.load}")
+    else:
+        store = fetch_store(args)
+        if args.save:
+            store.save(args.save)
+            logger.info(f"Saved {len(store):,} findings to {args.save}")
+
+    if args.interactive:
+        import code
+        banner = (f"{len(store):,} findings in store. Try:\n"
+                  f"  rows = store.select(severity='High', created_after=datetime(2024, 1, 1))\n"
+                  f"  store.group_by('bucket_name', rows)[:10]")
+        code.interact(banner=banner, local={'store': store, 'datetime': datetime})
+        return
+
+    start = time.perf_counter()
+    rows = store.select(
+        severity=args.severity,
+        bucket_name=split(args.buckets), account_id=split(args.accounts), region=split(args.regions),
+        finding_type=split(args.types), file_extension=split(args.extensions),
+        created_after=parse_date(args.created_after), created_before=parse_date(args.created_before)
+    )
+    groups = store.group_by(args.group_by.split(","), rows, value=args.sum)
+    logger.debug(f"Query over {len(store):,} findings took {time.perf_counter() - start:.3f}s")
+
+    print(f"{len(rows):,} of {len(store):,} findings match")
+    unit = args.sum or "findings"
+    for key, total in groups[:args.top]:
+        if isinstance(key, tuple):
+            key = " / ".join([str(k) for k in key])
+        print(f"{str(key):<80} {total:>12,} {unit}")
+
+
+def fetch_store(args):
+    since = None
+    if args.since:
+        since = datetime.strptime(args.since, "%Y-%m-%d")
+    filters = {'bucket': args.bucket, 'job_id': args.job_id, 'severity': args.fetch_severity,
+               'since': since}
+
+    region_results = []
+    if args.export_source:
+        regions = None
+        if args.region:
+            regions = [args.region]
+        findings = stream_exported_findings(args.export_source, regions, region_results, **filters)
+    else:
+        regions = resolve_regions(args)
+        findings = stream_findings(regions, build_criteria(**filters), region_results,
+                                   max_workers=args.max_workers, batches_in_flight=args.batches_in_flight)
+    with stage("build store"):
+        store = FindingsStore().load_stream(findings)
+    report_errors(region_results)
+    return(store)
+
+
+def split(value):
+    if value is None:
+        return(None)
+    return(set(value.split(",")))
+
+
+def parse_date(value):
+    if value is None:
+        return(None)
+    return(datetime.strptime(value, "%Y-%m-%d"))
+
+
+def do_args():
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--debug", help="print debugging info", action='store_true')
+    parser.add_argument("--error", help="print error info only", action='store_true')
+    parser.add_argument("--load", help="Query a store saved with --save instead of fetching findings")
+    parser.add_argument("--save", help="Save the fetched findings to this file for --load")
+    parser.add_argument("--interactive", help="Open a Python prompt with the findings in `store`", action='store_true')
+
+    # Which findings to fetch
+    parser.add_argument("--region", help="Only fetch findings from this region")
+    parser.add_argument("--bucket", help="Only fetch findings in this bucket")
+    parser.add_argument("--job-id", help="Only fetch findings from this job id")
+    parser.add_argument("--since", help="Only fetch findings after this date - specified as YYYY-MM-DD")
+    parser.add_argument("--fetch-severity", help="Only fetch findings of this severity and higher",
+                        choices=['High', 'Medium', 'Low'], default='Low')
+    parser.add_argument("--export-source", help="Read exported findings from this s3://bucket/prefix or local directory "
+                        "instead of calling the Macie API")
+
+    # The question to ask of them
+    parser.add_argument("--severity", help="Only count findings of this severity and higher", choices=['High', 'Medium', 'Low'])
+    parser.add_argument("--buckets", help="Only count findings in these comma separated buckets")
+    parser.add_argument("--accounts", help="Only count findings in these comma separated accounts")
+    parser.add_argument("--regions", help="Only count findings in these comma separated regions")
+    parser.add_argument("--types", help="Only count findings of these comma separated finding types")
+    parser.add_argument("--extensions", help="Only count findings in files with these comma separated extensions")
+    parser.add_argument("--created-after", help="Only count findings created on or after this date - YYYY-MM-DD")
+    parser.add_argument("--created-before", help="Only count findings created before this date - YYYY-MM-DD")
+    parser.add_argument("--group-by", help=f"Comma separated columns to group by, from {', '.join(STRING_COLUMNS + ['severity'])}",
+                        default="bucket_name")
+    parser.add_argument("--sum", help="Add up this column instead of counting findings",
+                        choices=COUNT_COLUMNS)
+    parser.add_argument("--top", help="How many groups to show", type=int, default=20)
+
+    parser.add_argument("--batches-in-flight", help="Number of get_findings calls to run at once",
+                        type=int, default=DEFAULT_BATCHES_IN_FLIGHT)
+    add_common_args(parser)
+    args = parser.parse_args()
+    return(args)
+
+
+if __name__ == '__main__':
+
+    args = do_args()
+
+    # Logging idea stolen from: https://docs.python.org/3/howto/logging.html#configuring-logging
+    # create console handler and set level to debug
+    ch = logging.StreamHandler()
+    if args.error:
+        logger.setLevel(logging.ERROR)
+    elif args.debug:
+        logger.setLevel(logging.DEBUG)
+    else:
+        logger.setLevel(logging.INFO)
+
+    # create formatter
+    # formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    formatter = logging.Formatter('%(name)s - %(levelname)s - %(message)s')
+    # add formatter to ch
+    ch.setFormatter(formatter)
+    # add ch to logger
+    logger.addHandler(ch)
+
+    start_common(args)
+
+    try:
+        main(args, logger)
+    except KeyboardInterrupt:
+        exit(1)
@@ -0,0 +1,121 @@
+#
+# Which buckets, key prefixes, file extensions and sensitive data categories dominate the findings?
+# Streams findings from Macie (or the exported findings) through fixed size sketches, so memory stays
+# the same however many findings there are.
+#
+
+from datetime import datetime
+
+from macie_automations.macie_clients import add_common_args, start_common
+from macie_automations.macie_fanout import report_errors
+from macie_automations.macie_findings import build_criteria, stream_findings, stream_exported_findings, DEFAULT_BATCHES_IN_FLIGHT
+from macie_automations.macie_profile import stage, timed
+from macie_automations.macie_regions import resolve_regions
+from macie_automations.macie_sketches import FindingsProfile, DEFAULT_CAPACITY, DEFAULT_WIDTH, DEFAULT_DEPTH
+
+import logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+logging.getLogger('botocore').setLevel(logging.WARNING)
+logging.getLogger('boto3').setLevel(logging.WARNING)
+logging.getLogger('urllib3').setLevel(logging.WARNING)
+
+HEADINGS = {
+    'bucket': ("Bucket", "Findings"),
+    'prefix': ("Key Prefix", "Findings"),
+    'extension': ("File Extension", "Findings"),
+    'category': ("Sensitive Data Category", "Detections"),
+}
+
+
+def main(args, logger):
+
+    since = None
+    if args.since:
+        since = datetime.strptime(args.since, "%Y-%m-%d")
+    filters = {'bucket': args.bucket, 'job_id': args.job_id, 'severity': args.severity,
+               'since': since}
+
+    region_results = []
+    if args.export_source:
+        regions = None
+        if args.region:
+            regions = [args.region]
+        findings = stream_exported_findings(args.export_source, regions, region_results, **filters)
+    else:
+        regions = resolve_regions(args)
+        findings = stream_findings(regions, build_criteria(**filters), region_results,
+                                   max_workers=args.max_workers, batches_in_flight=args.batches_in_flight)
+
+    profile = FindingsProfile(prefix_depth=args.prefix_depth, capacity=args.capacity, width=args.width, depth=args.depth)
+    for r, batch in timed("wait for findings", findings):
+        with stage("sketch"):
+            for f in batch:
+                profile.add(f)
+
+    print(f"{profile.findings:,} findings")
+    for dimension in profile.DIMENSIONS:
+        heading, unit = HEADINGS[dimension]
+        hitters = profile.dimensions[dimension]
+        print(f"\n{heading:<60} {unit:>12} {'+/-':>8} {'Share':>6}")
+        for item, count, error in hitters.top(args.top):
+            share = 100 * count / hitters.total if hitters.total else 0
+            print(f"{item[:60]:<60} {count:>12,} {error:>8,} {share:>5.1f}%")
+
+    report_errors(region_results)
+
+
+def do_args():
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--debug", help="print debugging info", action='store_true')
+    parser.add_argument("--error", help="print error info only", action='store_true')
+    parser.add_argument("--region", help="Only Process this region")
+    parser.add_argument("--bucket", help="Only look at findings in this bucket")
+    parser.add_argument("--job-id", help="Only look at findings from this job id")
+    parser.add_argument("--since", help="Only look at findings after this date - specified as YYYY-MM-DD")
+    parser.add_argument("--severity", help="Filter on this severity and higher",
+                        choices=['High', 'Medium', 'Low'], default='Low')
+    parser.add_argument("--top", help="How many of each to show", type=int, default=20)
+    parser.add_argument("--prefix-depth", help="How many folders of the object key make up a prefix", type=int, default=1)
+    parser.add_argument("--capacity", help="Items to track for each of buckets, prefixes, extensions and categories",
+                        type=int, default=DEFAULT_CAPACITY)
+    parser.add_argument("--width", help="Count-min sketch width", type=int, default=DEFAULT_WIDTH)
+    parser.add_argument("--depth", help="Count-min sketch depth", type=int, default=DEFAULT_DEPTH)
+    parser.add_argument("--export-source", help="Read exported findings from this s3://bucket/prefix or local directory "
+                        "instead of calling the Macie API")
+    parser.add_argument("--batches-in-flight", help="Number of get_findings calls to run at once",
+                        type=int, default=DEFAULT_BATCHES_IN_FLIGHT)
+    add_common_args(parser)
+    args = parser.parse_args()
+    return(args)
+
+
+if __name__ == '__main__':
+
+    args = do_args()
+
+    # Logging idea stolen from: https://docs.python.org/3/howto/logging.html#configuring-logging
+    # create console handler and set level to debug
+    ch = logging.StreamHandler()
+    if args.error:
+        logger.setLevel(logging.ERROR)
+    elif args.debug:
+        logger.setLevel(logging.DEBUG)
+    else:
+        logger.setLevel(logging.INFO)
+
+    # create formatter
+    # formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    formatter = logging.Formatter('%(name)s - %(levelname)s - %(message)s')
+    # add formatter to ch
+    ch.setFormatter(formatter)
+    # add ch to logger
+    logger.addHandler(ch)
+
+    start_common(args)
+
+    try:
+        main(args, logger)
+    except KeyboardInterrupt:
+        exit(1)
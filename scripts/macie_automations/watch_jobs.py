@@ -0,0 +1,280 @@
+#
+# Watch the running and paused classification jobs in every region, estimate when they'll finish, and
+# write metrics for them.
+#
+# Jobs are polled quickly while they're making progress and back off while nothing changes. Progress is
+# measured by how fast approximateNumberOfObjectsToProcess comes down between polls.
+#
+
+import json
+import os
+import tempfile
+import time
+import datetime
+
+from macie_automations.macie_clients import get_client, add_common_args, start_common
+from macie_automations.macie_fanout import fan_out, report_errors
+from macie_automations.macie_jobs import list_jobs, describe_jobs
+from macie_automations.macie_regions import resolve_regions
+
+import logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+logging.getLogger('botocore').setLevel(logging.WARNING)
+logging.getLogger('boto3').setLevel(logging.WARNING)
+logging.getLogger('urllib3').setLevel(logging.WARNING)
+
+ACTIVE_STATUSES = ['RUNNING', 'PAUSED', 'USER_PAUSED']
+PAUSED_STATUSES = ['PAUSED', 'USER_PAUSED']
+
+# Poll every MIN_INTERVAL seconds while jobs are moving, doubling up to MAX_INTERVAL while they aren't
+MIN_INTERVAL = 30
+MAX_INTERVAL = 600
+
+# How much each new rate counts towards the smoothed rate the ETA is based on
+RATE_SMOOTHING = 0.3
+
+# Warn again about a paused job this often
+DEFAULT_STUCK_AFTER = 60 * 60
+
+
+class JobTracker(object):
+    """Everything we've seen of one job since we started watching it."""
+
+    def __init__(self, job, region):
+        self.job_id = job['jobId']
+        self.name = job['name']
+        self.region = region
+        self.status = None
+        self.first_remaining = None
+        self.remaining = None
+        self.last_poll = None
+        self.rate = None
+        self.findings = 0
+        self.paused_since = None
+        self.last_alert = None
+
+    def update(self, details, findings, now):
+        """Record a poll. Returns True if the job moved since the last one."""
+        remaining = details['approximateNumberOfObjectsToProcess']
+        changed = details['jobStatus'] != self.status or remaining != self.remaining or findings != self.findings
+        if self.remaining is not None and self.last_poll is not None and now > self.last_poll:
+            rate = (self.remaining - remaining) / (now - self.last_poll)
+            if rate >= 0:
+                self.rate = rate if self.rate is None else RATE_SMOOTHING * rate + (1 - RATE_SMOOTHING) * self.rate
+        if self.first_remaining is None:
+            self.first_remaining = remaining
+        if details['jobStatus'] in PAUSED_STATUSES:
+            if self.paused_since is None:
+                self.paused_since = now
+        else:
+            self.paused_since = None
+            self.last_alert = None
+        self.status = details['jobStatus']
+        self.remaining = remaining
+        self.findings = findings
+        self.last_poll = now
+        return(changed)
+
+    def processed(self):
+        # Objects processed since we started watching. Macie doesn't report the total.
+        return(max(0, self.first_remaining - self.remaining))
+
+    def eta(self):
+        """Seconds until the job is done at the current rate, or None if we can't tell yet."""
+        if self.status != "RUNNING" or not self.rate:
+            return(None)
+        return(self.remaining / self.rate)
+
+    def check_paused(self, now, stuck_after):
+        if self.paused_since is None:
+            return
+        if self.last_alert is None:
+            logger.warning(f"{self.name} in {self.region} is {self.status}")
+            self.last_alert = now
+        elif now - self.last_alert >= stuck_after:
+            logger.warning(f"{self.name} in {self.region} has been {self.status} for {format_duration(now - self.paused_since)}")
+            self.last_alert = now
+
+
+def main(args, logger):
+
+    regions = resolve_regions(args)
+    filter = {'includes': [{'comparator': 'EQ', 'key': 'jobStatus', 'values': ACTIVE_STATUSES}]}
+
+    trackers = {}
+    interval = args.min_interval
+    while True:
+        now = time.time()
+        changed = poll(regions, filter, trackers, args, now)
+
+        if args.metrics_file:
+            write_metrics(args.metrics_file, args.metrics_format or metrics_format_for(args.metrics_file), trackers.values(), now)
+
+        if args.once or (args.exit_when_done and len(trackers) == 0):
+            break
+        # Check back soon if anything moved, otherwise back off
+        interval = args.min_interval if changed else min(args.max_interval, interval * 2)
+        logger.debug(f"Next poll in {interval}s")
+        time.sleep(interval)
+
+
+def poll(regions, filter, trackers, args, now):
+    """Update trackers with the current state of every active job. Returns True if any job moved."""
+    region_results = fan_out(list_jobs, regions, filter, max_workers=args.max_workers)
+    report_errors(region_results)
+    failed = [region_result.region for region_result in region_results if region_result.error is not None]
+
+    jobs = {}
+    for region_result in region_results:
+        if region_result.error is None:
+            for j in region_result.result:
+                jobs[j['jobId']] = region_result.region
+                if j['jobId'] not in trackers:
+                    trackers[j['jobId']] = JobTracker(j, region_result.region)
+                    logger.info(f"Watching {j['name']} in {region_result.region} ({j['jobId']})")
+
+    # Jobs we can't see any more have finished or been cancelled. Don't drop jobs from regions we couldn't list.
+    changed = False
+    for job_id in list(trackers):
+        if job_id not in jobs and trackers[job_id].region not in failed:
+            logger.info(f"{trackers[job_id].name} in {trackers[job_id].region} is no longer running")
+            del trackers[job_id]
+            changed = True
+
+    details = describe_jobs(jobs, max_workers=args.max_workers)
+    findings = {}
+    for region_result in fan_out(count_findings, sorted(set(jobs.values())), jobs, max_workers=args.max_workers):
+        if region_result.error is None:
+            findings.update(region_result.result)
+
+    for job_id, t in trackers.items():
+        if job_id not in details:
+            continue
+        if t.update(details[job_id], findings.get(job_id, 0), now):
+            changed = True
+        t.check_paused(now, args.stuck_after)
+        eta = t.eta()
+        print(f"{t.name} in {t.region} {t.status}: {t.remaining:,} objects to go, {t.processed():,} processed, "
+              f"{t.findings:,} findings, ETA {format_duration(eta) if eta is not None else 'unknown'}")
+    return(changed)
+
+
+def count_findings(r, jobs):
+    """Return {jobId: findings} for this region's jobs."""
+    job_ids = [job_id for job_id in jobs if jobs[job_id] == r]
+    macie_client = get_client('macie2', r)
+    response = macie_client.get_finding_statistics(
+        findingCriteria={'criterion': {'classificationDetails.jobId': {'eq': job_ids}}},
+        groupBy='classificationDetails.jobId',
+        size=len(job_ids)
+    )
+    return({group['groupKey']: group['count'] for group in response['countsByGroup']})
+
+
+def metrics_format_for(filename):
+    if filename.endswith((".jsonl", ".json")):
+        return("jsonl")
+    return("prometheus")
+
+
+def write_metrics(filename, fmt, trackers, now):
+    from dateutil import tz
+
+    if fmt == "jsonl":
+        # One line per job per poll
+        with open(filename, 'a') as f:
+            for t in trackers:
+                f.write(json.dumps({
+                    'time': datetime.datetime.fromtimestamp(now, tz.tzutc()).isoformat(), 'jobId': t.job_id,
+                    'name': t.name, 'region': t.region, 'status': t.status, 'objectsRemaining': t.remaining,
+                    'objectsProcessed': t.processed(), 'findings': t.findings, 'etaSeconds': t.eta()
+                }) + "\n")
+        return
+
+    # Prometheus textfile collector format. Replaced atomically so the collector never reads half a file.
+    lines = []
+    metrics = [
+        ('macie_job_objects_remaining', "Approximate objects the job has left to process", lambda t: t.remaining),
+        ('macie_job_objects_processed', "Objects processed since the watcher started", lambda t: t.processed()),
+        ('macie_job_findings', "Findings the job has created", lambda t: t.findings),
+        ('macie_job_eta_seconds', "Estimated seconds until the job finishes", lambda t: t.eta()),
+        ('macie_job_paused', "1 if the job is paused", lambda t: 1 if t.status in PAUSED_STATUSES else 0),
+    ]
+    trackers = [t for t in trackers if t.remaining is not None]
+    for name, description, value in metrics:
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} gauge")
+        for t in trackers:
+            v = value(t)
+            if v is not None:
+                labels = [('job_id', t.job_id), ('job_name', t.name), ('region', t.region), ('status', t.status)]
+                labels = ",".join([k + "=" + label_value(label) for k, label in labels])
+                lines.append(f"{name}{{{labels}}} {v}")
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filename)), prefix=f".{os.path.basename(filename)}.")
+    with os.fdopen(fd, 'w') as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp_path, filename)
+
+
+def label_value(value):
+    """Quote value for a Prometheus label, escaping the characters the exposition format says to."""
+    value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return(f'"{value}"')
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    if seconds < 3600:
+        return(f"{seconds // 60}m")
+    if seconds < 86400:
+        return(f"{seconds // 3600}h{(seconds % 3600) // 60:02d}m")
+    return(f"{seconds // 86400}d{(seconds % 86400) // 3600:02d}h")
+
+
+def do_args():
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--debug", help="print debugging info", action='store_true')
+    parser.add_argument("--error", help="print error info only", action='store_true')
+    parser.add_argument("--region", help="Only watch jobs in this region")
+    parser.add_argument("--once", help="Poll once and exit", action='store_true')
+    parser.add_argument("--exit-when-done", help="Exit once there are no running or paused jobs", action='store_true')
+    parser.add_argument("--min-interval", help="Seconds between polls while jobs are making progress", type=int, default=MIN_INTERVAL)
+    parser.add_argument("--max-interval", help="Longest to wait between polls while nothing changes", type=int, default=MAX_INTERVAL)
+    parser.add_argument("--stuck-after", help="Seconds between warnings about a paused job", type=int, default=DEFAULT_STUCK_AFTER)
+    parser.add_argument("--metrics-file", help="Write metrics here. .jsonl files get a JSON line per job per poll, anything else a Prometheus textfile")
+    parser.add_argument("--metrics-format", help="Override the metrics format picked from the filename", choices=['prometheus', 'jsonl'])
+    add_common_args(parser)
+    args = parser.parse_args()
+    return(args)
+
+
+if __name__ == '__main__':
+
+    args = do_args()
+
+    # Logging idea stolen from: https://docs.python.org/3/howto/logging.html#configuring-logging
+    # create console handler and set level to debug
+    ch = logging.StreamHandler()
+    if args.error:
+        logger.setLevel(logging.ERROR)
+    elif args.debug:
+        logger.setLevel(logging.DEBUG)
+    else:
+        logger.setLevel(logging.INFO)
+
+    # create formatter
+    # formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    formatter = logging.Formatter('%(name)s - %(levelname)s - %(message)s')
+    # add formatter to ch
+    ch.setFormatter(formatter)
+    # add ch to logger
+    logger.addHandler(ch)
+
+    start_common(args)
+
+    try:
+        main(args, logger)
+    except KeyboardInterrupt:
+        exit(1)
@@ -0,0 +1,9 @@
+#!/usr/bin/env python3
+
+#
+# Runs macie_automations/plan_scan_budget.py, so ./scripts/plan_scan_budget.py works from a checkout without installing.
+#
+
+import runpy
+
+runpy.run_module('macie_automations.plan_scan_budget', run_name='__main__')
@@ -0,0 +1,9 @@
+#!/usr/bin/env python3
+
+#
+# Runs macie_automations/query_findings.py, so ./scripts/query_findings.py works from a checkout without installing.
+#
+
+import runpy
+
+runpy.run_module('macie_automations.query_findings', run_name='__main__')
@@ -0,0 +1,9 @@
+#!/usr/bin/env python3
+
+#
+# Runs macie_automations/top_findings.py, so ./scripts/top_findings.py works from a checkout without installing.
+#
+
+import runpy
+
+runpy.run_module('macie_automations.top_findings', run_name='__main__')
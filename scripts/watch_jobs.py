@@ -0,0 +1,9 @@
+#!/usr/bin/env python3
+
+#
+# Runs macie_automations/watch_jobs.py, so ./scripts/watch_jobs.py works from a checkout without installing.
+#
+
+import runpy
+
+runpy.run_module('macie_automations.watch_jobs', run_name='__main__')
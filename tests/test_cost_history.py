@@ -0,0 +1,36 @@
+#
+# A day a group has no snapshot for should be left out of its trend, not counted as $0.
+#
+
+import sqlite3
+
+from macie_automations.macie_cost_history import SCHEMA, record_costs, load_cost_history, cost_trend
+
+
+def open_db():
+    db = sqlite3.connect(":memory:")
+    db.executescript(SCHEMA)
+    return(db)
+
+
+def test_missing_day_is_skipped():
+    db = open_db()
+    # us-west-2 failed on the 4th, and the 7th was a --region us-east-1 run
+    for day in range(1, 9):
+        regions = ['us-east-1', 'us-west-2']
+        if day in [4, 7]:
+            regions = ['us-east-1']
+        costs = {('*', r, 'SENSITIVE_DATA_DISCOVERY'): 10.0 * day for r in regions}
+        record_costs(db, costs, 'MONTH_TO_DATE', regions, False, snapshot_date=f"2024-03-{day:02d}")
+
+    series, dates = load_cost_history(db, 'MONTH_TO_DATE', ['region'])
+    assert len(dates) == 8
+    west = cost_trend(series[('us-west-2',)], dates, 'MONTH_TO_DATE', window=3)
+    assert [d for d, cost, change, per_day, anomaly in west] == \
+        ['2024-03-01', '2024-03-02', '2024-03-03', '2024-03-05', '2024-03-06', '2024-03-08']
+    # Spending $10 a day all along, across the gaps too
+    assert [per_day for d, cost, change, per_day, anomaly in west[1:]] == [10.0] * 5
+    assert [anomaly for d, cost, change, per_day, anomaly in west] == [None] * 6
+
+    east = cost_trend(series[('us-east-1',)], dates, 'MONTH_TO_DATE')
+    assert len(east) == 8
@@ -0,0 +1,25 @@
+#
+# When there are too many buckets for one get_finding_statistics call, the shards should add back up to
+# one count per bucket.
+#
+
+from macie_automations import macie_findings
+from macie_automations.macie_findings import get_counts_by_bucket, FINDING_TYPES
+
+
+class FakeMacie(object):
+    """Two buckets in one account, each with one finding of every type."""
+
+    def get_finding_statistics(self, findingCriteria, size, groupBy):
+        criterion = findingCriteria['criterion']
+        if 'type' not in criterion:
+            # Pretend it's over the limit until it's split by finding type
+            return({'countsByGroup': [{'groupKey': f"bucket-{i}", 'count': 1} for i in range(size)]})
+        return({'countsByGroup': [{'groupKey': 'alpha', 'count': 2}, {'groupKey': 'beta', 'count': 1}]})
+
+
+def test_finding_type_shards_are_merged(monkeypatch):
+    monkeypatch.setattr(macie_findings, 'GROUP_LIMIT', 10)
+    counts = get_counts_by_bucket(FakeMacie(), 'us-east-1', {'category': {'eq': ['CLASSIFICATION']}}, ['111111111111'])
+    assert sorted([(g['groupKey'], g['count']) for g in counts]) == \
+        [('alpha', 2 * len(FINDING_TYPES)), ('beta', len(FINDING_TYPES))]
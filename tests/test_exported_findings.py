@@ -0,0 +1,73 @@
+#
+# Reading findings from a local copy of the findings export bucket should pick out the same findings as
+# asking the Macie API with the same filters.
+#
+
+import os
+from datetime import datetime, timezone
+
+import pytest
+
+from macie_automations.macie_findings import build_criteria, epoch_millis, list_export_files, read_export_file, stream_exported_findings
+
+EXPORT_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "export")
+
+
+def criteria_match(f, findingCriteria):
+    # What Macie does with build_criteria()'s criteria: eq is any of, dates are compared in epoch millis
+    for path, conditions in findingCriteria['criterion'].items():
+        value = f
+        for part in path.split("."):
+            value = value[part]
+        if isinstance(value, datetime):
+            value = epoch_millis(value)
+        if 'eq' in conditions and value not in conditions['eq']:
+            return(False)
+        if 'gte' in conditions and value < conditions['gte']:
+            return(False)
+        if 'lte' in conditions and value > conditions['lte']:
+            return(False)
+    return(True)
+
+
+def all_findings():
+    return([f for name, fileobj in list_export_files(EXPORT_DIR) for f in read_export_file(name, fileobj)])
+
+
+def exported_ids(regions=None, **filters):
+    return(sorted([f['id'] for r, batch in stream_exported_findings(EXPORT_DIR, regions, **filters) for f in batch]))
+
+
+FILTERS = [
+    ({}, ['f1', 'f2', 'f3', 'f5', 'f6']),
+    ({'bucket': 'alpha'}, ['f1', 'f2', 'f6']),
+    ({'job_id': 'job-2'}, ['f3', 'f6']),
+    ({'severity': 'Medium'}, ['f1', 'f3', 'f5', 'f6']),
+    ({'severity': 'High'}, ['f1', 'f6']),
+    ({'since': datetime(2024, 2, 1, tzinfo=timezone.utc)}, ['f2', 'f3', 'f6']),
+    ({'since': datetime(2024, 1, 15, tzinfo=timezone.utc), 'until': datetime(2024, 2, 15, tzinfo=timezone.utc)}, ['f2', 'f3', 'f5']),
+    ({'updated_since': epoch_millis(datetime(2024, 2, 20, tzinfo=timezone.utc))}, ['f2', 'f6']),
+    ({'bucket': 'alpha', 'severity': 'High'}, ['f1', 'f6']),
+]
+
+
+@pytest.mark.parametrize("filters, expected", FILTERS)
+def test_export_filters_match_api(filters, expected):
+    api = sorted([f['id'] for f in all_findings() if f['category'] == 'CLASSIFICATION'
+                  and criteria_match(f, build_criteria(**filters))])
+    assert api == expected
+    assert exported_ids(**filters) == expected
+
+
+def test_regions_and_counts():
+    region_results = []
+    batches = list(stream_exported_findings(EXPORT_DIR, ['us-west-2'], region_results))
+    assert [r for r, batch in batches] == ['us-west-2']
+    assert sorted([f['id'] for f in batches[0][1]]) == ['f5', 'f6']
+    assert [(r.region, r.result, r.error) for r in region_results] == [('us-west-2', 2, None)]
+
+
+def test_bad_lines_are_skipped_and_dates_parsed():
+    findings = all_findings()
+    assert len(findings) == 6
+    assert findings[0]['createdAt'] == datetime(2024, 1, 1, 10, tzinfo=timezone.utc)
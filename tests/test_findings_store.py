@@ -0,0 +1,45 @@
+#
+# A saved findings store should load back the same, and loading never runs anything from the file.
+#
+
+import os
+import pickle
+
+import pytest
+
+from macie_automations.macie_findings import stream_exported_findings
+from macie_automations.macie_store import FindingsStore
+
+EXPORT_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "export")
+
+
+def test_save_and_load(tmp_path):
+    store = FindingsStore().load_stream(stream_exported_findings(EXPORT_DIR, severity='Low'))
+    assert len(store) == 5
+    path = str(tmp_path / "store")
+    store.save(path)
+
+    loaded = FindingsStore.load(path)
+    assert loaded.strings == store.strings
+    assert loaded.columns == store.columns
+    assert len(loaded.select(bucket_name='alpha')) == len(store.select(bucket_name='alpha'))
+
+
+def test_pickle_is_not_loaded(tmp_path):
+    path = str(tmp_path / "store")
+    with open(path, 'wb') as f:
+        pickle.dump({'version': 1}, f)
+    with pytest.raises(ValueError):
+        FindingsStore.load(path)
+
+
+def test_truncated_store(tmp_path):
+    store = FindingsStore().load_stream(stream_exported_findings(EXPORT_DIR, severity='Low'))
+    path = str(tmp_path / "store")
+    store.save(path)
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(data[:-3])
+    with pytest.raises(ValueError):
+        FindingsStore.load(path)
@@ -0,0 +1,85 @@
+#
+# extract_findings_to_csv.py --incremental should export every finding exactly once, whatever order
+# get_findings hands a batch back in, and a batch that fails to write should be exported on the next run.
+#
+
+import argparse
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from macie_automations import extract_findings_to_csv, macie_findings
+
+START = datetime(2024, 3, 1, tzinfo=timezone.utc)
+
+
+def finding(n, minutes):
+    return({'id': f"f{n}", 'updatedAt': START + timedelta(minutes=minutes), 'severity': {'description': 'High'}})
+
+
+class FakeMacie(object):
+    """list_findings in updatedAt order, but get_findings returns each batch backwards."""
+
+    def __init__(self, findings):
+        self.findings = findings
+
+    def list_findings(self, findingCriteria, maxResults, sortCriteria=None, nextToken=None):
+        since = findingCriteria['criterion'].get('updatedAt', {}).get('gte', 0)
+        ids = [f['id'] for f in sorted(self.findings, key=extract_findings_to_csv.updated_order)
+               if macie_findings.epoch_millis(f['updatedAt']) >= since]
+        return({'findingIds': ids})
+
+    def get_findings(self, findingIds, sortCriteria=None):
+        return({'findings': [f for f in reversed(self.findings) if f['id'] in findingIds]})
+
+
+class RecordingSink(object):
+
+    def __init__(self, fail_on=None):
+        self.written = []
+        self.fail_on = fail_on
+
+    def write(self, r, findings):
+        if len(self.written) + 1 == self.fail_on:
+            raise OSError("disk full")
+        self.written.append([f['id'] for f in findings])
+
+    def close(self):
+        pass
+
+
+def export(tmp_path, monkeypatch, findings, sink):
+    monkeypatch.setattr(macie_findings, 'get_client', lambda service, region=None: FakeMacie(findings))
+    monkeypatch.setattr(extract_findings_to_csv, 'open_sink', lambda *args, **kwargs: sink)
+    args = argparse.Namespace(since=None, bucket=None, job_id=None, severity='Medium', incremental=True,
+                              state_file=str(tmp_path / "watermarks.json"), export_source=None, region='us-east-1',
+                              format='jsonl', filename=str(tmp_path / "findings.jsonl"), row_group_size=None,
+                              max_workers=1, batches_in_flight=2)
+    extract_findings_to_csv.main(args, extract_findings_to_csv.logger)
+    return(sink.written)
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv('MACIE_CACHE_DIR', str(tmp_path))
+
+
+def test_unsorted_batches_export_everything_once(tmp_path, monkeypatch):
+    findings = [finding(1, 0), finding(2, 1), finding(3, 1), finding(4, 2)]
+    assert export(tmp_path, monkeypatch, findings, RecordingSink()) == [['f1', 'f2', 'f3', 'f4']]
+    assert export(tmp_path, monkeypatch, findings, RecordingSink()) == [[]]
+
+    findings.append(finding(5, 2))
+    findings.append(finding(6, 3))
+    assert export(tmp_path, monkeypatch, findings, RecordingSink()) == [['f5', 'f6']]
+
+
+def test_failed_write_is_exported_next_time(tmp_path, monkeypatch):
+    monkeypatch.setattr(macie_findings, 'GET_BATCH_SIZE', 2)
+    findings = [finding(1, 0), finding(2, 1), finding(3, 2), finding(4, 3)]
+    with pytest.raises(OSError):
+        export(tmp_path, monkeypatch, findings, RecordingSink(fail_on=2))
+    assert os.path.exists(tmp_path / "watermarks.json")
+
+    assert export(tmp_path, monkeypatch, findings, RecordingSink()) == [['f3'], ['f4']]
@@ -0,0 +1,58 @@
+#
+# The budget planner's plans should never go over budget, and should give each bucket one level from its
+# ladder, reached without skipping any of the levels below it.
+#
+
+import random
+
+import pytest
+
+from macie_automations.macie_pricing import scan_cost
+from macie_automations.plan_scan_budget import build_ladder, evaluate, assign_levels
+
+LEVELS = [10, 25, 50, 100]
+
+
+def random_buckets(count, seed):
+    rand = random.Random(seed)
+    sizes = [rand.randint(1, 10**13) for i in range(count)]
+    priorities = [rand.uniform(1, 20) for i in range(count)]
+    return(sizes, priorities)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_plan_fits_budget_and_levels(seed):
+    sizes, priorities = random_buckets(200, seed)
+    ladder = build_ladder(sizes, priorities, LEVELS)
+    full_cost = sum([scan_cost(size) for size in sizes])
+
+    for budget in [0, 1, 100, 1000, full_cost / 2, full_cost, full_cost * 2]:
+        result = evaluate(ladder, budget)
+        assert result['cost'] <= budget
+
+        levels = assign_levels(ladder, result['steps'], len(sizes))
+        assert set(levels) <= set(LEVELS + [None])
+        assert len([level for level in levels if level is not None]) == result['buckets']
+        cost = sum([scan_cost(size, level) for size, level in zip(sizes, levels) if level is not None])
+        assert cost == pytest.approx(result['cost'])
+
+        # Every upgrade taken for a bucket is the next level up from the one before it
+        taken = {}
+        for j in range(result['steps']):
+            taken.setdefault(ladder['bucket'][j], []).append(ladder['level'][j])
+        for i, steps in taken.items():
+            assert steps == LEVELS[:len(steps)]
+            assert levels[i] == steps[-1]
+
+
+def test_whole_budget_scans_everything_in_full():
+    sizes, priorities = random_buckets(50, 0)
+    ladder = build_ladder(sizes, priorities, LEVELS)
+    result = evaluate(ladder, sum([scan_cost(size) for size in sizes]) * 1.01)
+    assert assign_levels(ladder, result['steps'], len(sizes)) == [100] * len(sizes)
+
+
+def test_free_steps_are_skipped():
+    ladder = build_ladder([0, 10**12], [5, 5], [1, 100])
+    assert ladder['bucket'] == [1, 1]
+    assert evaluate(ladder, 10**6)['buckets'] == 1